@@ -8,10 +8,15 @@ import time
 import json
 import math
 import cv2
+import numpy as np
 from typing import List, Dict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from logger import logger
 from utils.video_tool import extract_video_frames_use_thread, get_video_fps
+from utils.frame_tool import FrameStore, get_frame_sampler, frame_signatures, dedup_signatures, select_diverse_histograms, image_budget_from_context, build_contact_sheets
+from utils.stream_tool import stream_frames, get_frame_arena
+from config import FRAME_DEDUP_OPTIONS, FRAME_BUDGET_OPTIONS, CONTACT_SHEET_OPTIONS, RESOLUTION_LADDER_OPTIONS, OLLAMA_OPTIONS, DEFAULT_LANGUAGE
+from sys_prompts import DEFAULT_PROMPT
 from utils.gpt_tool import analyze_image, analyze_multi_images
 
 
@@ -23,17 +28,28 @@ def _analyze_frame_in_thread(frame_data: tuple) -> Dict | None:
     """
     frame_path, second, frame = frame_data
     try:
-        result = analyze_image(image_path=frame_path)
+        resolution = None
+        if RESOLUTION_LADDER_OPTIONS["enable"]:
+            # the extracted frame at scale_ratio is the last rung
+            with open(frame_path, 'rb') as f:
+                image_data = base64.b64encode(f.read()).decode('utf-8')
+            prompt = DEFAULT_PROMPT["one_frame"][DEFAULT_LANGUAGE] + DEFAULT_PROMPT["confidence_field"][DEFAULT_LANGUAGE]
+            result, resolution = analyze_with_resolution_ladder([image_data], lambda images_data, width: analyze_multi_images(images_data, prompt=prompt))
+        else:
+            result = analyze_image(image_path=frame_path)
         if not result:
             return None
         
-        return {
+        frame_info = {
             "file": frame_path,
             "desc": result["desc"],
             "tag": result["tag"],
             "frame": int(frame),
             "second": int(second)
         }
+        if resolution is not None:
+            frame_info["resolution"] = resolution
+        return frame_info
     except Exception as e:
         logger.error(f"analyze frame {frame_path} failed: {str(e)}")
         return None
@@ -157,14 +173,47 @@ def analyze_video_frames(video_path: str, interval: int = 0, max_workers: int =
         return None
 
 
-def analyze_video_multi_frames(video_path: str, interval: int = 0, target_width: int = 320):
+def analyze_video_multi_frames(video_path: str, interval: int = 0, target_width: int = 320, start_frame: int = 0, end_frame: int = None, keyframe_frames=None, sampler: str = "seek", dedup_options: dict = None, budget_options: dict = None):
     """analyze multi video frames
+    Args:
+        same as prepare_video_multi_frames
+    Returns:
+        dict: {"desc": "", "tag": [], "duration": 0, "fps": 0, "total_frames": 0, "analyzed_frames": 0, "frames": []}
+    """
+    prepared = prepare_video_multi_frames(video_path, interval, target_width, start_frame, end_frame, keyframe_frames, sampler, dedup_options, budget_options)
+    if not prepared:
+        return None
+    return analyze_prepared_frames(prepared)
+
+
+def analyze_prepared_frames(prepared: dict):
+    """send frames from prepare_video_multi_frames to the vision model
+    Args:
+        prepared (dict): {"images_data", "duration", "fps", "total_frames", "dropped_frames", "seconds"}
+    Returns:
+        dict: {"desc": "", "tag": [], "duration": 0, "fps": 0, "total_frames": 0, "analyzed_frames": 0}
+    """
+    try:
+        return _analyze_images_data(**prepared)
+    except Exception as e:
+        logger.error(f"analyze prepared frames failed: {str(e)}")
+        return None
+
+
+def prepare_video_multi_frames(video_path: str, interval: int = 0, target_width: int = 320, start_frame: int = 0, end_frame: int = None, keyframe_frames=None, sampler: str = "seek", dedup_options: dict = None, budget_options: dict = None) -> dict | None:
+    """decode, filter and encode the frames of a video segment, cpu side of analyze_video_multi_frames
     Args:
         video_path (str): video path
         interval (int): interval seconds
         target_width (int): target width for resizing frames to reduce token usage, default 320
+        start_frame (int): segment start frame, analyze a range of the video instead of the whole file
+        end_frame (int): segment end frame (exclusive), default the end of the video
+        keyframe_frames (np.ndarray): keyframe index of the video, move seek targets onto nearby keyframes
+        sampler (str): frame sampler backend, "seek", "grab", "ffmpeg" or "auto", default "seek"
+        dedup_options (dict): near-duplicate frame filter options, default FRAME_DEDUP_OPTIONS
+        budget_options (dict): per scene image budget options, default FRAME_BUDGET_OPTIONS
     Returns:
-        dict: {"desc": "", "tag": [], "duration": 0, "fps": 0, "total_frames": 0, "analyzed_frames": 0, "frames": []}
+        dict: {"images_data": [base64 jpeg], "duration": 0, "fps": 0, "total_frames": 0, "dropped_frames": None, "seconds": [frame second]}
     """
     try:
         if not os.path.exists(video_path):
@@ -183,64 +232,332 @@ def analyze_video_multi_frames(video_path: str, interval: int = 0, target_width:
             return None
         
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if end_frame is not None:
+            total_frames = min(total_frames, end_frame)
+        total_frames -= start_frame
         duration = int(total_frames / fps)
         
-        images_data = []
-        for second in range(0, duration, interval + 1 if interval > 0 else 1):
-            # set frame number
-            frame_number = second * fps
-            if frame_number >= total_frames:
-                break
-                
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
-            ret, frame = cap.read()
-            
-            if not ret:
-                logger.warning(f"failed to read frame at second {second}, frame number: {frame_number}")
-                continue
-            
-            # resize frame to reduce token usage
-            height, width = frame.shape[:2]
-            if width > target_width:
-                # calculate new height maintaining aspect ratio
-                new_height = int(height * target_width / width)
-                frame = cv2.resize(frame, (target_width, new_height), interpolation=cv2.INTER_AREA)
-                logger.debug(f"resized frame from {width}x{height} to {target_width}x{new_height}")
-            
-            # frame to base64 with optimized quality
-            encode_params = [cv2.IMWRITE_JPEG_QUALITY, 70]  # further reduce quality to minimize size
-            _, buffer = cv2.imencode('.jpg', frame, encode_params)
-            frame_base64 = base64.b64encode(buffer).decode('utf-8')
-            images_data.append(frame_base64)
-            
-            if len(images_data) == 1:
-                logger.info(f"single frame base64 size: {len(frame_base64) / 1024:.2f} KB")
-        
         cap.release()
-        logger.info(f"extracted {len(images_data)} frames from video, duration: {duration}s")
-        
-        res_analyze = analyze_multi_images(images_data)
-        if not res_analyze:
-            logger.error(f"analyze multi images failed")
+
+        # one frame every (interval + 1) seconds, frames are resized to target_width to reduce token usage
+        step = (interval + 1 if interval > 0 else 1) * fps
+        sample_start_frame = start_frame
+        sample_end_frame = start_frame + min(duration * fps, total_frames)
+        if sample_end_frame <= sample_start_frame and total_frames > 0:
+            # scenes shorter than one second still send their middle frame
+            sample_start_frame = start_frame + total_frames // 2
+            sample_end_frame = sample_start_frame + 1
+        frame_sampler = get_frame_sampler(
+            video_path,
+            sampler=sampler,
+            target_width=target_width,
+            step=step,
+            sample_count=len(range(sample_start_frame, sample_end_frame, step)),
+            keyframe_frames=keyframe_frames,
+        )
+        if not frame_sampler:
             return None
 
-        desc = res_analyze.get("desc", "")
-        tag = res_analyze.get("tag", [])
-        if not tag:
-            tag = ["video_frames", "base64_encoded"]
+        # decoded frames stream through a bounded queue, only signatures and jpeg bytes are kept per frame
+        need_signatures = _filters_enabled(dedup_options, budget_options)
+        arena = get_frame_arena()
+        signatures, frame_size, seconds = [], None, []
+        encode_params = [cv2.IMWRITE_JPEG_QUALITY, 70]  # further reduce quality to minimize size
+        for frame_number, frame in stream_frames(frame_sampler.sample(sample_start_frame, sample_end_frame, step)):
+            seconds.append((frame_number - start_frame) / fps)
+            if need_signatures:
+                signatures.append(frame_signatures([frame]))
+            frame_size = frame.shape[1], frame.shape[0]
+            _, buffer = cv2.imencode('.jpg', frame, encode_params)
+            arena.append(buffer)
+        signatures = _stack_signatures(signatures) if need_signatures else None
+
+        kept, dropped_frames = _dedup_frames(signatures, len(arena), dedup_options)
+        kept = _budget_frames(signatures, frame_size, kept, budget_options)
 
-        video_info = {
-            "desc": desc,
-            "tag": tag,
+        # frame to base64 with optimized quality
+        images_data = [base64.b64encode(arena.view(i)).decode('utf-8') for i in kept]
+        if images_data:
+            logger.info(f"single frame base64 size: {len(images_data[0]) / 1024:.2f} KB")
+        
+        logger.info(f"extracted {len(images_data)} frames from video, duration: {duration}s")
+        
+        return {
+            "images_data": images_data,
             "duration": duration,
             "fps": fps,
             "total_frames": total_frames,
-            "analyzed_frames": len(images_data)
+            "dropped_frames": dropped_frames,
+            "seconds": [seconds[i] for i in kept],
         }
-        
-        return video_info
     except Exception as e:
-        logger.error(f"analyze video multi frames failed: {str(e)}")
+        logger.error(f"prepare video multi frames failed: {str(e)}")
         if 'cap' in locals():
             cap.release()
         return None
+
+
+def _filters_enabled(dedup_options: dict = None, budget_options: dict = None) -> bool:
+    """whether frame signatures are needed by the dedup filter or the image budget"""
+    return (dedup_options or FRAME_DEDUP_OPTIONS)["enable"] or (budget_options or FRAME_BUDGET_OPTIONS)["enable"]
+
+
+def _stack_signatures(signatures: list) -> tuple:
+    """stack per frame frame_signatures into (dhash, ahash, hist)"""
+    if not signatures:
+        return np.zeros((0, 64), dtype=bool), np.zeros((0, 64), dtype=bool), np.zeros((0, 48))
+    return tuple(np.concatenate(parts) for parts in zip(*signatures))
+
+
+def _dedup_frames(signatures: tuple, count: int, dedup_options: dict = None) -> tuple[list, int | None]:
+    """find near-duplicate frames before analysis
+    Args:
+        signatures (tuple): (dhash, ahash, hist) of frame_signatures, None when no filter is enabled
+        count (int): frame count
+        dedup_options (dict): {"enable", "hash_threshold", "hist_threshold"}, default FRAME_DEDUP_OPTIONS
+    Returns:
+        tuple: (kept frame indexes, dropped count or None when the filter is disabled)
+    """
+    dedup_options = dedup_options or FRAME_DEDUP_OPTIONS
+    if not dedup_options["enable"]:
+        return list(range(count)), None
+    kept = dedup_signatures(*signatures, hash_threshold=dedup_options["hash_threshold"], hist_threshold=dedup_options["hist_threshold"])
+    dropped_frames = count - len(kept)
+    if dropped_frames:
+        logger.info(f"dropped {dropped_frames} near-duplicate frames of {count}")
+    return kept, dropped_frames
+
+
+def _budget_frames(signatures: tuple, frame_size: tuple, kept: list, budget_options: dict = None) -> list:
+    """keep the most diverse frames within the per scene image budget
+    Args:
+        signatures (tuple): (dhash, ahash, hist) of frame_signatures, None when no filter is enabled
+        frame_size (tuple): (width, height) of the frames
+        kept (list): indexes of frames still in play
+        budget_options (dict): {"enable", "max_images", "reserved_tokens"}, default FRAME_BUDGET_OPTIONS
+    Returns:
+        list: selected frame indexes in time order
+    """
+    budget_options = budget_options or FRAME_BUDGET_OPTIONS
+    if not budget_options["enable"] or not kept:
+        return kept
+    budget = budget_options["max_images"]
+    if budget <= 0:
+        width, height = frame_size
+        budget = image_budget_from_context(OLLAMA_OPTIONS["num_ctx"], width, height, budget_options["reserved_tokens"])
+    if len(kept) <= budget:
+        return kept
+    selected = select_diverse_histograms(signatures[2][kept], budget)
+    logger.info(f"selected {len(selected)} of {len(kept)} frames within image budget {budget}")
+    return [kept[i] for i in selected]
+
+
+def pack_contact_sheets(images_data: list, seconds: list, contact_sheet_options: dict = None) -> list:
+    """tile base64 jpeg frames into labelled contact sheets
+    Args:
+        images_data (list): base64 jpeg list in time order
+        seconds (list): second of every frame within the segment
+        contact_sheet_options (dict): {"columns", "rows", "cell_width", "jpeg_quality"}, default CONTACT_SHEET_OPTIONS
+    Returns:
+        list: base64 jpeg contact sheets
+    """
+    contact_sheet_options = contact_sheet_options or CONTACT_SHEET_OPTIONS
+    frames = [cv2.imdecode(np.frombuffer(base64.b64decode(data), dtype=np.uint8), cv2.IMREAD_COLOR) for data in images_data]
+    sheets = build_contact_sheets(
+        frames,
+        seconds,
+        columns=contact_sheet_options["columns"],
+        rows=contact_sheet_options["rows"],
+        cell_width=contact_sheet_options["cell_width"],
+    )
+    encode_params = [cv2.IMWRITE_JPEG_QUALITY, contact_sheet_options["jpeg_quality"]]
+    return [base64.b64encode(cv2.imencode('.jpg', sheet, encode_params)[1]).decode('utf-8') for sheet in sheets]
+
+
+def scale_images_data(images_data: list, width: int, jpeg_quality: int = 70) -> list:
+    """downscale base64 jpeg frames to width, frames not wider than width are returned as they are"""
+    scaled = []
+    for data in images_data:
+        frame = cv2.imdecode(np.frombuffer(base64.b64decode(data), dtype=np.uint8), cv2.IMREAD_COLOR)
+        height, frame_width = frame.shape[:2]
+        if frame_width <= width:
+            scaled.append(data)
+            continue
+        frame = cv2.resize(frame, (width, max(int(height * width / frame_width), 1)), interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        scaled.append(base64.b64encode(buffer).decode('utf-8'))
+    return scaled
+
+
+def is_weak_response(result: dict, ladder_options: dict = None) -> bool:
+    """whether a vision response is too poor to keep: missing, short desc, only generic tags or low self-reported confidence
+    Args:
+        result (dict): {"desc", "tag", "confidence"} from the vision model, confidence is optional
+        ladder_options (dict): {"min_desc_chars", "min_tags", "min_confidence", "generic_tags"}, default RESOLUTION_LADDER_OPTIONS
+    """
+    ladder_options = ladder_options or RESOLUTION_LADDER_OPTIONS
+    if not result:
+        return True
+    if len(str(result.get("desc") or "").strip()) < ladder_options["min_desc_chars"]:
+        return True
+    generic_tags = set(ladder_options["generic_tags"])
+    tags = {str(tag).strip().lower() for tag in result.get("tag") or []} - generic_tags - {""}
+    if len(tags) < ladder_options["min_tags"]:
+        return True
+    try:
+        confidence = float(result["confidence"])
+    except (KeyError, TypeError, ValueError):
+        # the model may leave out the field, judge by desc and tags only
+        return False
+    return confidence < ladder_options["min_confidence"]
+
+
+def analyze_with_resolution_ladder(images_data: list, analyze, ladder_options: dict = None) -> tuple[dict | None, int | None]:
+    """analyze frames at the lowest ladder width first, re-query one rung up while the response is weak
+    Args:
+        images_data (list): base64 jpeg frames at full resolution, the last rung
+        analyze (callable): analyze(images_data, width) -> vision result dict or None
+        ladder_options (dict): {"widths", "jpeg_quality", ...}, default RESOLUTION_LADDER_OPTIONS
+    Returns:
+        tuple: (result, frame width of the answering rung), the last usable result when every rung is weak
+    """
+    ladder_options = ladder_options or RESOLUTION_LADDER_OPTIONS
+    frame = cv2.imdecode(np.frombuffer(base64.b64decode(images_data[0]), dtype=np.uint8), cv2.IMREAD_COLOR)
+    source_width = frame.shape[1]
+    widths = sorted({width for width in ladder_options["widths"] if 0 < width < source_width}) + [source_width]
+
+    best, best_width = None, None
+    for rung, width in enumerate(widths):
+        rung_images = images_data if width == source_width else scale_images_data(images_data, width, ladder_options["jpeg_quality"])
+        result = analyze(rung_images, width)
+        if result:
+            best, best_width = result, width
+        if not is_weak_response(result, ladder_options):
+            break
+        if rung < len(widths) - 1:
+            logger.info(f"weak response at width {width}, re-query at width {widths[rung + 1]}")
+    return best, best_width
+
+
+def _analyze_images_data(images_data: list, duration: int, fps: int, total_frames: int, dropped_frames: int = None, seconds: list = None, contact_sheet_options: dict = None, ladder_options: dict = None) -> dict | None:
+    """analyze base64 frames of one video segment
+    Args:
+        images_data (list): base64 jpeg list
+        duration (int): segment duration seconds
+        fps (int): video fps
+        total_frames (int): segment total frames
+        dropped_frames (int): near-duplicate frames dropped before analysis, recorded when not None
+        seconds (list): second of every frame, needed for contact sheet labels
+        contact_sheet_options (dict): contact sheet options, default CONTACT_SHEET_OPTIONS
+        ladder_options (dict): resolution ladder options, default RESOLUTION_LADDER_OPTIONS
+    Returns:
+        dict: {"desc": "", "tag": [], "duration": 0, "fps": 0, "total_frames": 0, "analyzed_frames": 0},
+            with "resolution", the frame width of the ladder rung that answered, when the ladder is enabled
+    """
+    contact_sheet_options = contact_sheet_options or CONTACT_SHEET_OPTIONS
+    ladder_options = ladder_options or RESOLUTION_LADDER_OPTIONS
+    use_contact_sheets = contact_sheet_options["enable"] and seconds is not None and len(images_data) > 1
+    prompt = DEFAULT_PROMPT["multi_frame_contact_sheet" if use_contact_sheets else "multi_frame"][DEFAULT_LANGUAGE]
+
+    def analyze(images_data, width=None):
+        if not use_contact_sheets:
+            return analyze_multi_images(images_data, prompt=prompt)
+        # on a ladder rung the cells shrink with the frames
+        options = {**contact_sheet_options, "cell_width": min(contact_sheet_options["cell_width"], width)} if width else contact_sheet_options
+        sheets = pack_contact_sheets(images_data, seconds, options)
+        logger.info(f"packed {len(images_data)} frames into {len(sheets)} contact sheets")
+        return analyze_multi_images(sheets, prompt=prompt)
+
+    resolution = None
+    if ladder_options["enable"] and images_data:
+        prompt += DEFAULT_PROMPT["confidence_field"][DEFAULT_LANGUAGE]
+        res_analyze, resolution = analyze_with_resolution_ladder(images_data, analyze, ladder_options)
+    else:
+        res_analyze = analyze(images_data)
+    if not res_analyze:
+        logger.error(f"analyze multi images failed")
+        return None
+
+    desc = res_analyze.get("desc", "")
+    tag = res_analyze.get("tag", [])
+    if not tag:
+        tag = ["video_frames", "base64_encoded"]
+
+    video_info = {
+        "desc": desc,
+        "tag": tag,
+        "duration": duration,
+        "fps": fps,
+        "total_frames": total_frames,
+        "analyzed_frames": len(images_data)
+    }
+    if dropped_frames is not None:
+        video_info["dropped_frames"] = dropped_frames
+    if resolution is not None:
+        video_info["resolution"] = resolution
+    
+    return video_info
+
+
+def analyze_sampled_scene(scene: dict, dedup_options: dict = None, budget_options: dict = None):
+    """analyze a scene sampled by ingest_video or sample_timeline_frames, without opening the video again
+    Args:
+        scene (dict): scene from ingest_video or sample_timeline_frames
+        dedup_options (dict): near-duplicate frame filter options, default FRAME_DEDUP_OPTIONS
+        budget_options (dict): per scene image budget options, default FRAME_BUDGET_OPTIONS
+    Returns:
+        dict: {"desc": "", "tag": [], "duration": 0, "fps": 0, "total_frames": 0, "analyzed_frames": 0}
+    """
+    try:
+        jpeg_list = [frame["data"] for frame in scene["frames"]]
+        signatures, frame_size = None, None
+        if _filters_enabled(dedup_options, budget_options):
+            # decode one frame at a time, only its signature is kept
+            signatures = []
+            for data in jpeg_list:
+                frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                signatures.append(frame_signatures([frame]))
+                frame_size = frame.shape[1], frame.shape[0]
+            signatures = _stack_signatures(signatures)
+        kept, dropped_frames = _dedup_frames(signatures, len(jpeg_list), dedup_options)
+        kept = _budget_frames(signatures, frame_size, kept, budget_options)
+        images_data = [base64.b64encode(jpeg_list[i]).decode('utf-8') for i in kept]
+        logger.info(f"analyze sampled scene {scene['start_time']}-{scene['end_time']}, frames: {len(images_data)}")
+        seconds = [scene["frames"][i]["second"] for i in kept]
+        return _analyze_images_data(images_data, scene["duration"], scene["fps"], scene["total_frames"], dropped_frames, seconds)
+    except Exception as e:
+        logger.error(f"analyze sampled scene failed: {str(e)}")
+        return None
+
+
+def analyze_stored_scene(frame_store: FrameStore, scene_id: int, dedup_options: dict = None, budget_options: dict = None):
+    """analyze a scene of a frame store, frames are read from the memmap and only kept frames are encoded
+    Args:
+        frame_store (FrameStore): frame store from build_frame_store
+        scene_id (int): scene index in the timeline
+        dedup_options (dict): near-duplicate frame filter options, default FRAME_DEDUP_OPTIONS
+        budget_options (dict): per scene image budget options, default FRAME_BUDGET_OPTIONS
+    Returns:
+        dict: {"desc": "", "tag": [], "duration": 0, "fps": 0, "total_frames": 0, "analyzed_frames": 0}
+    """
+    try:
+        scene = frame_store.scenes[scene_id]
+        rows = frame_store.scene_rows(scene_id)
+        frame_size = frame_store.frames.shape[2], frame_store.frames.shape[1]
+        signatures = None
+        if _filters_enabled(dedup_options, budget_options):
+            signatures = _stack_signatures([frame_signatures([frame_store.frames[row]]) for row in rows])
+        kept, dropped_frames = _dedup_frames(signatures, len(rows), dedup_options)
+        kept = _budget_frames(signatures, frame_size, kept, budget_options)
+
+        encode_params = [cv2.IMWRITE_JPEG_QUALITY, 70]
+        images_data = []
+        for row in rows[kept]:
+            _, buffer = cv2.imencode('.jpg', frame_store.frames[row], encode_params)
+            images_data.append(base64.b64encode(buffer).decode('utf-8'))
+        logger.info(f"analyze stored scene {scene['start_time']}-{scene['end_time']}, frames: {len(images_data)}")
+        seconds = frame_store.index["second"][rows[kept]].tolist()
+        return _analyze_images_data(images_data, scene["duration"], scene["fps"], scene["total_frames"], dropped_frames, seconds)
+    except Exception as e:
+        logger.error(f"analyze stored scene failed: {str(e)}")
+        return None
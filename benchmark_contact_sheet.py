@@ -0,0 +1,119 @@
+# -*- coding: UTF-8 -*-
+# benchmark_contact_sheet.py
+# compare per-frame and contact sheet vision analysis on latency, vision tokens and captions
+
+import os
+import json
+import time
+import base64
+import argparse
+import cv2
+import numpy as np
+from analysisi_video import prepare_video_multi_frames, pack_contact_sheets
+from benchmark_frame_sampler import make_synthetic_video
+from utils.frame_tool import estimate_image_tokens
+from utils.gpt_tool import analyze_multi_images
+from config import TEMP_DIR, DEFAULT_LANGUAGE, CONTACT_SHEET_OPTIONS
+from sys_prompts import DEFAULT_PROMPT
+
+
+def image_stats(images_data: list) -> tuple[int, int]:
+    """(estimated vision tokens, payload bytes) of base64 jpeg images"""
+    tokens = 0
+    for data in images_data:
+        image = cv2.imdecode(np.frombuffer(base64.b64decode(data), dtype=np.uint8), cv2.IMREAD_COLOR)
+        tokens += estimate_image_tokens(image.shape[1], image.shape[0])
+    return tokens, sum(len(data) for data in images_data)
+
+
+def tag_agreement(tags: list, reference: list) -> float:
+    """jaccard similarity of two tag lists"""
+    tags, reference = set(tags or []), set(reference or [])
+    if not tags and not reference:
+        return 1.0
+    return len(tags & reference) / len(tags | reference)
+
+
+def run_mode(images_data: list, prompt: str = None) -> dict:
+    """one uncached vision call
+    Returns:
+        dict: {"seconds", "tokens", "bytes", "images", "result"}
+    """
+    tokens, size = image_stats(images_data)
+    start = time.perf_counter()
+    try:
+        result = analyze_multi_images(images_data, prompt=prompt, use_cache=False)
+    except Exception as e:
+        result = {"error": str(e)}
+    return {"seconds": time.perf_counter() - start, "tokens": tokens, "bytes": size, "images": len(images_data), "result": result}
+
+
+def benchmark(video_path: str, scene_seconds: int, scene_count: int, contact_sheet_options: dict) -> list[dict]:
+    """analyze consecutive windows of the video in per-frame mode and in contact sheet mode
+    Returns:
+        list[dict]: per window {"start", "frames", "per_frame", "contact_sheet", "tag_agreement"}
+    """
+    cap = cv2.VideoCapture(video_path)
+    fps = int(round(cap.get(cv2.CAP_PROP_FPS)))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    results = []
+    for start_frame in range(0, total_frames, scene_seconds * fps)[:scene_count]:
+        prepared = prepare_video_multi_frames(video_path, start_frame=start_frame, end_frame=start_frame + scene_seconds * fps)
+        if not prepared or not prepared["images_data"]:
+            continue
+        images_data = prepared["images_data"]
+        sheets = pack_contact_sheets(images_data, prepared["seconds"], contact_sheet_options)
+
+        per_frame = run_mode(images_data)
+        contact_sheet = run_mode(sheets, prompt=DEFAULT_PROMPT["multi_frame_contact_sheet"][DEFAULT_LANGUAGE])
+        results.append({
+            "start": start_frame / fps,
+            "frames": len(images_data),
+            "per_frame": per_frame,
+            "contact_sheet": contact_sheet,
+            "tag_agreement": tag_agreement((contact_sheet["result"] or {}).get("tag"), (per_frame["result"] or {}).get("tag")),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark contact sheet packing against per-frame vision analysis")
+    parser.add_argument("--video", default=None, help="video to analyze, default a synthetic video")
+    parser.add_argument("--scene-seconds", type=int, default=8, help="seconds per analyzed window, one frame per second")
+    parser.add_argument("--scenes", type=int, default=5)
+    parser.add_argument("--columns", type=int, default=CONTACT_SHEET_OPTIONS["columns"])
+    parser.add_argument("--rows", type=int, default=CONTACT_SHEET_OPTIONS["rows"])
+    parser.add_argument("--cell-width", type=int, default=CONTACT_SHEET_OPTIONS["cell_width"])
+    args = parser.parse_args()
+
+    bench_dir = f"{TEMP_DIR}benchmark_contact_sheet/"
+    os.makedirs(bench_dir, exist_ok=True)
+    video_path = args.video
+    if not video_path:
+        video_path = f"{bench_dir}synthetic_{args.scene_seconds * args.scenes}s.mp4"
+        if not os.path.exists(video_path):
+            make_synthetic_video(video_path, args.scene_seconds * args.scenes)
+
+    options = {**CONTACT_SHEET_OPTIONS, "columns": args.columns, "rows": args.rows, "cell_width": args.cell_width}
+    results = benchmark(video_path, args.scene_seconds, args.scenes, options)
+
+    print(f"{'start':>7} {'frames':>6} {'mode':>14} {'images':>6} {'tokens':>7} {'KB':>7} {'seconds':>8} {'desc len':>8} {'tags':>5} {'tag agree':>9}")
+    for row in results:
+        for mode in ("per_frame", "contact_sheet"):
+            run = row[mode]
+            result = run["result"] or {}
+            agreement = f"{row['tag_agreement']:.2f}" if mode == "contact_sheet" else ""
+            print(f"{row['start']:>6.0f}s {row['frames']:>6} {mode:>14} {run['images']:>6} {run['tokens']:>7} {run['bytes'] / 1024:>7.1f} {run['seconds']:>8.2f} {len(result.get('desc', '')):>8} {len(result.get('tag', [])):>5} {agreement:>9}")
+
+    if results:
+        for mode in ("per_frame", "contact_sheet"):
+            print(f"{mode}: mean {np.mean([row[mode]['seconds'] for row in results]):.2f}s, mean {np.mean([row[mode]['tokens'] for row in results]):.0f} vision tokens")
+        print(f"mean tag agreement: {np.mean([row['tag_agreement'] for row in results]):.2f}")
+
+    # captions of both modes side by side for a manual quality review
+    report_path = f"{bench_dir}report.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"captions saved to {report_path}")
@@ -0,0 +1,84 @@
+# -*- coding: UTF-8 -*-
+# benchmark_frame_sampler.py
+# compare frame sampler backends on synthetic videos
+
+import os
+import time
+import shutil
+import argparse
+import cv2
+import numpy as np
+from utils.frame_tool import FRAME_SAMPLERS, select_frame_sampler, get_frame_sampler
+from config import TEMP_DIR
+
+
+def make_synthetic_video(video_path: str, seconds: int, fps: int = 30, size: tuple = (1280, 720)):
+    """write a synthetic video with moving shapes and a scene change every few seconds
+    Args:
+        video_path (str): output video path
+        seconds (int): video duration
+        fps (int, optional): fps. Defaults to 30.
+        size (tuple, optional): (width, height). Defaults to (1280, 720).
+    """
+    rng = np.random.default_rng(seconds)
+    width, height = size
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    color = rng.integers(0, 255, 3)
+    noise = rng.integers(0, 40, (height, width, 3), dtype=np.uint8)
+    for i in range(seconds * fps):
+        if i % (fps * 4) == 0:
+            color = rng.integers(0, 255, 3)
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = color
+        frame += noise
+        x = (i * 7) % width
+        cv2.circle(frame, (x, height // 2), height // 6, (255, 255, 255), -1)
+        cv2.putText(frame, str(i), (40, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 3)
+        writer.write(frame)
+    writer.release()
+
+
+def benchmark(video_path: str, step: int, target_width: int = 320, repeat: int = 3) -> dict:
+    """time every sampler backend on one video and sampling step
+    Returns:
+        dict: {sampler name: (best seconds, sampled frames, same frame numbers as the seek backend)}
+    """
+    results = {}
+    reference = None
+    for name in FRAME_SAMPLERS:
+        if name == "ffmpeg" and not shutil.which("ffmpeg"):
+            continue
+        best, frame_numbers = None, []
+        for _ in range(repeat):
+            frame_sampler = get_frame_sampler(video_path, sampler=name, target_width=target_width)
+            start = time.perf_counter()
+            frame_numbers = [frame_number for frame_number, _ in frame_sampler.sample(0, frame_sampler.total_frames, step)]
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        reference = frame_numbers if reference is None else reference
+        results[name] = (best, len(frame_numbers), frame_numbers == reference)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark frame sampler backends")
+    parser.add_argument("--seconds", type=int, nargs="+", default=[30, 120])
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--steps", type=float, nargs="+", default=[0.5, 1, 5], help="seconds between samples")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bench_dir = f"{TEMP_DIR}benchmark_frame_sampler/"
+    os.makedirs(bench_dir, exist_ok=True)
+
+    print(f"{'video':>10} {'step':>8} {'sampler':>8} {'frames':>7} {'seconds':>9} {'ms/frame':>9} {'auto':>7} {'same frames':>12}")
+    for seconds in args.seconds:
+        video_path = f"{bench_dir}synthetic_{seconds}s.mp4"
+        if not os.path.exists(video_path):
+            make_synthetic_video(video_path, seconds, fps=args.fps)
+        for step_seconds in args.steps:
+            step = max(int(step_seconds * args.fps), 1)
+            auto = select_frame_sampler(args.fps, step, len(range(0, seconds * args.fps, step)))
+            for name, (elapsed, count, same_frames) in benchmark(video_path, step, repeat=args.repeat).items():
+                per_frame = elapsed / count * 1000 if count else 0
+                print(f"{seconds:>9}s {step_seconds:>7}s {name:>8} {count:>7} {elapsed:>9.3f} {per_frame:>9.2f} {'*' if name == auto else '':>7} {str(same_frames):>12}")
@@ -0,0 +1,86 @@
+# -*- coding: UTF-8 -*-
+# benchmark_ingest.py
+# compare single-pass ingest with scene detection followed by timeline sampling, on time and on the scenes found
+
+import os
+import json
+import time
+import shutil
+import argparse
+from benchmark_frame_sampler import make_synthetic_video
+from utils.ingest_tool import ingest_video
+from utils.video_tool import split_video_by_scenes
+from utils.frame_tool import sample_timeline_frames
+from config import TEMP_DIR
+
+
+def run_multi_pass(video_path: str, work_dir: str) -> tuple[float, list]:
+    """split_video_by_scenes (virtual segments, fresh stats) then sample_timeline_frames
+    Returns:
+        tuple: (seconds, scene list)
+    """
+    shutil.rmtree(work_dir, ignore_errors=True)
+    start = time.perf_counter()
+    timeline_path = split_video_by_scenes(video_path, work_dir, virtual_segments=True)
+    with open(timeline_path, 'r', encoding='utf-8') as f:
+        video_timeline = json.loads(f.read())
+    scene_list = sample_timeline_frames(video_path, video_timeline)
+    return time.perf_counter() - start, scene_list
+
+
+def run_single_pass(video_path: str, work_dir: str) -> tuple[float, list]:
+    """ingest_video
+    Returns:
+        tuple: (seconds, scene list)
+    """
+    shutil.rmtree(work_dir, ignore_errors=True)
+    start = time.perf_counter()
+    scene_list = ingest_video(video_path, work_dir)
+    return time.perf_counter() - start, scene_list
+
+
+def compare(multi_pass: list, single_pass: list) -> dict:
+    """equivalence of two scene lists
+    cuts and black frame verdicts should match; sampled frames match only when scene starts fall on the sample grid,
+    ingest samples every (interval + 1) seconds from the start of the video, timeline sampling from every scene start
+    Returns:
+        dict: {"same_cuts", "same_valid", "same_samples"}
+    """
+    bounds = lambda scenes: [(scene["start_frame"], scene["end_frame"]) for scene in scenes]
+    same_cuts = bounds(multi_pass) == bounds(single_pass)
+    return {
+        "same_cuts": same_cuts,
+        "same_valid": same_cuts and [scene["valid"] for scene in multi_pass] == [scene["valid"] for scene in single_pass],
+        "same_samples": same_cuts and all(
+            [frame["frame"] for frame in a["frames"]] == [frame["frame"] for frame in b["frames"]]
+            for a, b in zip(multi_pass, single_pass)
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark single-pass ingest against multi-pass scene detection and sampling")
+    parser.add_argument("--video", default=None, help="video to ingest, default synthetic videos")
+    parser.add_argument("--seconds", type=int, nargs="+", default=[30])
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    bench_dir = f"{TEMP_DIR}benchmark_ingest/"
+    os.makedirs(bench_dir, exist_ok=True)
+    video_paths = [args.video] if args.video else []
+    for seconds in ([] if args.video else args.seconds):
+        video_path = f"{bench_dir}synthetic_{seconds}s_{args.width}x{args.height}.mp4"
+        if not os.path.exists(video_path):
+            make_synthetic_video(video_path, seconds, size=(args.width, args.height))
+        video_paths.append(video_path)
+
+    print(f"{'video':>40} {'multi-pass':>11} {'single-pass':>12} {'scenes':>7} {'same cuts':>10} {'same valid':>11} {'same samples':>13}")
+    for video_path in video_paths:
+        multi_seconds, multi_pass = run_multi_pass(video_path, f"{bench_dir}multi_pass/")
+        single_seconds, single_pass = run_single_pass(video_path, f"{bench_dir}single_pass/")
+        if not multi_pass or not single_pass:
+            print(f"{os.path.basename(video_path):>40} failed")
+            continue
+        result = compare(multi_pass, single_pass)
+        print(f"{os.path.basename(video_path):>40} {multi_seconds:>10.2f}s {single_seconds:>11.2f}s {len(single_pass):>7} {str(result['same_cuts']):>10} {str(result['same_valid']):>11} {str(result['same_samples']):>13}")
@@ -12,8 +12,11 @@ TEMP_DIR = f"{PROJECT_FOLDER}temp/"
 RESOURCE_DIR = f"{PROJECT_FOLDER}resource/"
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+# comma separated, requests are balanced across all hosts, default OLLAMA_HOST only
+OLLAMA_HOSTS = [host.strip() for host in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if host.strip()]
 OLLAMA_VISION_MODEL = os.getenv("OLLAMA_VISION_MODEL", "qwen2.5vl:7b")
 OLLAMA_CHAT_MODEL = os.getenv("OLLAMA_CHAT_MODEL", "qwen3:14b")
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "bge-m3")
 
 # Ollama模型参数配置
 OLLAMA_OPTIONS = {
@@ -25,6 +28,104 @@ OLLAMA_OPTIONS = {
 
 OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "60"))
 
+# all ollama calls share one keep-alive connection pool per host, requests queue per model by priority,
+# model concurrency is per host
+OLLAMA_GATEWAY_OPTIONS = {
+    "model_concurrency": {
+        OLLAMA_VISION_MODEL: int(os.getenv("OLLAMA_VISION_CONCURRENCY", "2")),
+        OLLAMA_CHAT_MODEL: int(os.getenv("OLLAMA_CHAT_CONCURRENCY", "1")),
+    },
+    "default_concurrency": 1,
+    "max_connections": int(os.getenv("OLLAMA_MAX_CONNECTIONS", "8")),
+    "keepalive_expiry": float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60")),
+    "probe_interval": float(os.getenv("OLLAMA_PROBE_INTERVAL", "30")),    # /api/tags health probe seconds, with several hosts
+    # a host drains the queue of its loaded model before switching model, model loads take 10-30s
+    "residency": os.getenv("OLLAMA_RESIDENCY_ENABLE", "true").lower() == "true",
+    "keep_alive": os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+    "max_hold_seconds": float(os.getenv("OLLAMA_MAX_HOLD_SECONDS", "120")),     # other models waiting longer force a switch
+}
+
+# drop near-duplicate frames before vision analysis
+FRAME_DEDUP_OPTIONS = {
+    "enable": os.getenv("FRAME_DEDUP_ENABLE", "false").lower() == "true",
+    "hash_threshold": int(os.getenv("FRAME_DEDUP_HASH_THRESHOLD", "5")),       # max hamming distance of 64 bit dHash/aHash
+    "hist_threshold": float(os.getenv("FRAME_DEDUP_HIST_THRESHOLD", "0.1")),   # max colour histogram distance, 0-1
+}
+
+# per scene image budget of vision analysis, the most diverse frames are kept
+FRAME_BUDGET_OPTIONS = {
+    "enable": os.getenv("FRAME_BUDGET_ENABLE", "false").lower() == "true",
+    "max_images": int(os.getenv("FRAME_BUDGET_MAX_IMAGES", "0")),                # 0: derive from OLLAMA_NUM_CTX
+    "reserved_tokens": int(os.getenv("FRAME_BUDGET_RESERVED_TOKENS", "2048")),   # context kept for prompt and response
+}
+
+# heuristic highlight score per scene from tiny frames and audio, the bottom drop_percent of scenes skip vision analysis
+HIGHLIGHT_FILTER_OPTIONS = {
+    "enable": os.getenv("HIGHLIGHT_FILTER_ENABLE", "false").lower() == "true",
+    "drop_percent": float(os.getenv("HIGHLIGHT_DROP_PERCENT", "30")),
+    "sample_fps": float(os.getenv("HIGHLIGHT_SAMPLE_FPS", "2")),
+    "target_width": int(os.getenv("HIGHLIGHT_TARGET_WIDTH", "160")),
+    "weights": {
+        "motion": float(os.getenv("HIGHLIGHT_WEIGHT_MOTION", "1.0")),
+        "colourfulness": float(os.getenv("HIGHLIGHT_WEIGHT_COLOURFULNESS", "0.5")),
+        "sharpness": float(os.getenv("HIGHLIGHT_WEIGHT_SHARPNESS", "0.5")),
+        "faces": float(os.getenv("HIGHLIGHT_WEIGHT_FACES", "1.0")),
+        "loudness": float(os.getenv("HIGHLIGHT_WEIGHT_LOUDNESS", "1.0")),
+    },
+}
+
+# after scene detection, scenes shorter than min_seconds are merged into their neighbours
+# and scenes longer than max_seconds are split, 0 disables either
+SCENE_LENGTH_OPTIONS = {
+    "min_seconds": float(os.getenv("SCENE_MIN_SECONDS", "0")),
+    "max_seconds": float(os.getenv("SCENE_MAX_SECONDS", "0")),
+}
+
+# tile the frames of a scene into labelled grid images, one image per columns x rows frames instead of one per frame
+CONTACT_SHEET_OPTIONS = {
+    "enable": os.getenv("CONTACT_SHEET_ENABLE", "false").lower() == "true",
+    "columns": int(os.getenv("CONTACT_SHEET_COLUMNS", "3")),
+    "rows": int(os.getenv("CONTACT_SHEET_ROWS", "3")),
+    "cell_width": int(os.getenv("CONTACT_SHEET_CELL_WIDTH", "320")),
+    "jpeg_quality": int(os.getenv("CONTACT_SHEET_JPEG_QUALITY", "80")),
+}
+
+# coarse-to-fine vision analysis: scenes are analyzed at the lowest width first and re-queried one rung up while the response is weak,
+# the last rung is always the prepared frame resolution
+RESOLUTION_LADDER_OPTIONS = {
+    "enable": os.getenv("RESOLUTION_LADDER_ENABLE", "false").lower() == "true",
+    "widths": [int(width) for width in os.getenv("RESOLUTION_LADDER_WIDTHS", "128,224").split(",") if width.strip()],
+    "jpeg_quality": int(os.getenv("RESOLUTION_LADDER_JPEG_QUALITY", "70")),
+    "min_desc_chars": int(os.getenv("RESOLUTION_LADDER_MIN_DESC_CHARS", "50")),
+    "min_tags": int(os.getenv("RESOLUTION_LADDER_MIN_TAGS", "3")),                 # tags beyond the generic ones
+    "min_confidence": float(os.getenv("RESOLUTION_LADDER_MIN_CONFIDENCE", "0.6")),
+    "generic_tags": [tag.strip().lower() for tag in os.getenv("RESOLUTION_LADDER_GENERIC_TAGS", "video,frame,frames,image,picture,scene,unknown,视频,画面,图片,场景,未知").split(",") if tag.strip()],
+}
+
+# decoded frames stream through a bounded queue, the in-flight bytes are capped across all workers
+FRAME_STREAM_OPTIONS = {
+    "queue_size": int(os.getenv("FRAME_STREAM_QUEUE_SIZE", "8")),
+    "max_inflight_mb": int(os.getenv("FRAME_STREAM_MAX_INFLIGHT_MB", "256")),
+}
+
+# segment info in script prompts: "compact" table of times, tags and desc, or the full "json"
+SCRIPT_PROMPT_ENCODING = os.getenv("SCRIPT_PROMPT_ENCODING", "compact")
+
+# script prompts over the chat model context switch to map-reduce: chunks of scenes are summarized and scored first
+SCRIPT_MAP_REDUCE_OPTIONS = {
+    "enable": os.getenv("SCRIPT_MAP_REDUCE_ENABLE", "true").lower() == "true",
+    "reserved_tokens": int(os.getenv("SCRIPT_RESERVED_TOKENS", "2048")),                 # context kept for the response
+    "candidates_per_chunk": int(os.getenv("SCRIPT_CANDIDATES_PER_CHUNK", "6")),
+    "workers": int(os.getenv("SCRIPT_MAP_WORKERS", "4")),
+}
+
+# only the scenes most similar to the perspective go into script prompts, by embedding of scene desc and tags
+SCENE_RETRIEVAL_OPTIONS = {
+    "enable": os.getenv("SCENE_RETRIEVAL_ENABLE", "false").lower() == "true",
+    "top_k": int(os.getenv("SCENE_RETRIEVAL_TOP_K", "40")),                  # fewer scenes are sent as they are
+    "batch_size": int(os.getenv("SCENE_RETRIEVAL_BATCH_SIZE", "32")),        # scenes per embed request
+}
+
 # default video language
 DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "zh")
 
@@ -47,6 +148,13 @@ MUSIC_API_CONFIG = {
 # music cache dir
 MUSIC_CACHE_DIR = os.path.join(PROJECT_FOLDER, "cache", "music")
 
+# model response cache, keyed on model, options, prompts and image content
+RESPONSE_CACHE_OPTIONS = {
+    "enable": os.getenv("RESPONSE_CACHE_ENABLE", "true").lower() == "true",   # false: always call the model for sampling variety
+    "path": os.getenv("RESPONSE_CACHE_PATH", os.path.join(PROJECT_FOLDER, "cache", "response_cache.sqlite")),
+    "max_mb": int(os.getenv("RESPONSE_CACHE_MAX_MB", "256")),
+}
+
 # image api config
 PIXABAY_API_CONFIG = {
     "base_url": "https://pixabay.com/api/",
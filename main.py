@@ -6,29 +6,62 @@ import json
 import time
 import shutil
 import subprocess
+import threading
 import concurrent.futures
 from turtle import st
 from typing import List
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter, ValidationError, create_model
 
 from utils.tts_tool import generate_tts
-from utils.video_tool import split_video_by_scenes, is_valid_video, cut_video_by_time, merge_video_audio, concat_video
+from utils.video_tool import split_video_by_scenes, is_valid_video, cut_video_by_time, merge_video_audio, concat_video, build_keyframe_index, get_video_fps
 from utils.common import get_md5
-from utils.gpt_tool import get_gpt_response
-from analysisi_video import analyze_video_multi_frames
-from config import TEMP_DIR, DEFAULT_LANGUAGE
-from sys_prompts import DEFAULT_PROMPT, MULTI_PERSPECTIVE_PROMPTS
+from utils.gpt_tool import get_gpt_response, stream_gpt_response
+from utils.script_tool import compress_segments, dump_segment_info, ClipStreamParser
+from utils.prompt_tool import prompt_requirements
+from utils.retrieval_tool import retrieve_segments
+from utils.highlight_tool import HighlightFeatureTap, score_scenes, select_highlight_scenes
+from utils.ingest_tool import ingest_video
+from utils.frame_tool import sample_timeline_frames, build_frame_store
+from analysisi_video import prepare_video_multi_frames, analyze_prepared_frames, analyze_sampled_scene, analyze_stored_scene
+from config import TEMP_DIR, DEFAULT_LANGUAGE, SCENE_RETRIEVAL_OPTIONS, HIGHLIGHT_FILTER_OPTIONS
+from sys_prompts import DEFAULT_PROMPT, MULTI_PERSPECTIVE_PROMPTS, PERSPECTIVE_QUERIES
 from logger import logger
 
 
+# script response classes
+class VideoClip(BaseModel):
+    start: float
+    end: float
+    screen_text: str
+    narration: str
+
+
+class VideoClipArray(BaseModel):
+    video_clips: List[VideoClip]
+
+
 class AutoClip(BaseModel):
     video_path: str
     video_name: str = ""
     temp_dir: str = ""
     re_preprocess: bool = False
     re_generate_scripts: bool = False
+    single_pass: bool = False
+    scene_detect_workers: int = 1
+    decode_workers: int = 1
+    vlm_concurrency: int = 1
+    virtual_segments: bool = False
+    use_keyframe_index: bool = False
+    batch_sampling: bool = False
+    frame_store: bool = False
+    batch_perspectives: bool = False
+    perspective_batch_size: int = 5
+    stream_scripts: bool = False
     video_segment_info_json_path: str = ""
     video_script_json_path: str = ""
+    keyframe_index_path: str = ""
+    scene_index_path: str = ""
+    frame_store_dir: str = ""
 
     def __init__(self, video_path, **data):
         super().__init__(video_path=video_path, **data)
@@ -38,6 +71,9 @@ class AutoClip(BaseModel):
             os.makedirs(self.temp_dir)
         self.video_segment_info_json_path = f"{self.temp_dir}video_segment_info.json"
         self.video_script_json_path = f"{self.temp_dir}video_script.json"
+        self.keyframe_index_path = f"{self.temp_dir}keyframe_index.npz"
+        self.scene_index_path = f"{self.temp_dir}scene_index.npz"
+        self.frame_store_dir = f"{self.temp_dir}frame_store/"
 
     def preprocess_video_segment(self):
         """preprocess video
@@ -51,39 +87,224 @@ class AutoClip(BaseModel):
                     video_segment_info_list = json.loads(f.read())
                 if video_segment_info_list:
                     return True
+
+        if self.single_pass:
+            return self._preprocess_video_segment_single_pass()
         
-        res_split = split_video_by_scenes(self.video_path, self.temp_dir)
+        # batch sampling and the frame store read every frame from the source video, split files would never be read
+        split_video = not (self.batch_sampling or self.frame_store)
+        res_split = split_video_by_scenes(self.video_path, self.temp_dir, workers=self.scene_detect_workers, virtual_segments=self.virtual_segments, split_video=split_video)
         if not res_split:
             return None
         with open(res_split, 'r', encoding='utf-8') as f:
             video_timeline_json = json.loads(f.read())
+        video_timeline_json = self._filter_highlights(video_timeline_json)
 
-        video_segment_info_list = []
-        for video_scene in video_timeline_json:
-            video_scene_path = f"{self.temp_dir}{video_scene['video_name']}"
-            if not is_valid_video(video_scene_path):
-                logger.error(f"video {video_scene_path} is invalid, skip")
-                continue
-            video_scene_info = analyze_video_multi_frames(video_scene_path)
+        if self.frame_store:
+            # decode the sampled frames once into a memmap store shared by all consumers
+            return self._analyze_stored_scenes(build_frame_store(self.video_path, self.frame_store_dir, video_timeline_json))
+
+        if self.batch_sampling:
+            # sample every scene from the source in one forward pass
+            return self._analyze_sampled_scenes(sample_timeline_frames(self.video_path, video_timeline_json))
+
+        keyframe_index = self._get_keyframe_index() if self.virtual_segments else None
+
+        if self.decode_workers > 1 or self.vlm_concurrency > 1:
+            video_segment_info_list = self._analyze_scenes_concurrently(video_timeline_json, keyframe_index)
+        else:
+            video_segment_info_list = []
+            for video_scene in video_timeline_json:
+                prepared = self._prepare_scene(video_scene, keyframe_index)
+                video_scene_info = self._analyze_prepared_scene(video_scene, prepared)
+                if video_scene_info:
+                    video_segment_info_list.append(video_scene_info)
+
+        with open(self.video_segment_info_json_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(video_segment_info_list, ensure_ascii=False, indent=2))
+        return True
+
+    def _scene_source(self, video_scene, keyframe_index=None):
+        """video path and frame range of a scene
+        Returns:
+            tuple: (video path, segment range kwargs)
+        """
+        if self.virtual_segments:
+            # seek into the source video instead of opening a split file
+            segment_range = {'start_frame': video_scene['start_frame'], 'end_frame': video_scene['end_frame']}
+            if keyframe_index is not None:
+                segment_range['keyframe_frames'] = keyframe_index['keyframe_frames']
+            return self.video_path, segment_range
+        return f"{self.temp_dir}{video_scene['video_name']}", {}
+
+    def _prepare_scene(self, video_scene, keyframe_index=None):
+        """cpu side of scene analysis: black frame check, decode and encode frames
+        Returns:
+            dict: prepared frames from prepare_video_multi_frames, None when the scene is skipped
+        """
+        video_scene_path, segment_range = self._scene_source(video_scene, keyframe_index)
+        if not is_valid_video(video_scene_path, **segment_range):
+            logger.error(f"video {video_scene_path} {segment_range} is invalid, skip")
+            return None
+        prepared = prepare_video_multi_frames(video_scene_path, **segment_range)
+        if not prepared:
+            logger.error(f"video {video_scene_path} {segment_range} prepare frames failed, skip")
+        return prepared
+
+    def _analyze_prepared_scene(self, video_scene, prepared):
+        """vision model side of scene analysis
+        Returns:
+            dict: video segment info, None when the scene is skipped
+        """
+        if not prepared:
+            return None
+        video_scene_info = analyze_prepared_frames(prepared)
+        if not video_scene_info:
+            logger.error(f"scene {video_scene['start_time']}-{video_scene['end_time']} analyze failed, skip")
+            return None
+        video_scene_info.update(video_scene)
+        return video_scene_info
+
+    def _analyze_scenes_concurrently(self, video_timeline_json, keyframe_index=None):
+        """decode scenes on decode_workers threads while at most vlm_concurrency scenes wait on the vision model
+        prepared scenes in memory are bounded by decode_workers + vlm_concurrency
+        Returns:
+            list: video segment info in scene order
+        """
+        slots = threading.BoundedSemaphore(self.decode_workers + self.vlm_concurrency)
+        results = [None] * len(video_timeline_json)
+
+        def analyze(index, prepared):
+            try:
+                results[index] = self._analyze_prepared_scene(video_timeline_json[index], prepared)
+            finally:
+                slots.release()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.vlm_concurrency) as vlm_executor:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.decode_workers) as decode_executor:
+                def on_prepared(index, future):
+                    prepared = None
+                    try:
+                        prepared = future.result()
+                    except Exception as e:
+                        logger.error(f"prepare scene {index} failed: {str(e)}")
+                    if not prepared:
+                        slots.release()
+                        return
+                    vlm_executor.submit(analyze, index, prepared)
+
+                for index, video_scene in enumerate(video_timeline_json):
+                    slots.acquire()
+                    future = decode_executor.submit(self._prepare_scene, video_scene, keyframe_index)
+                    future.add_done_callback(lambda f, index=index: on_prepared(index, f))
+
+        return [video_scene_info for video_scene_info in results if video_scene_info]
+
+    def _get_keyframe_index(self):
+        """keyframe index of the source video, cached in temp dir"""
+        if not self.use_keyframe_index:
+            return None
+        return build_keyframe_index(self.video_path, self.keyframe_index_path)
+
+    def _preprocess_video_segment_single_pass(self):
+        """preprocess video with one decode of the source
+        scene cuts, black frame check and frame sampling come from ingest_video
+        """
+        # highlight features ride along the ingest decode instead of a second pass over the video
+        feature_tap = HighlightFeatureTap(get_video_fps(self.video_path) or 1) if HIGHLIGHT_FILTER_OPTIONS["enable"] else None
+        scene_list = ingest_video(self.video_path, self.temp_dir, frame_tap=feature_tap)
+        return self._analyze_sampled_scenes(self._filter_highlights(scene_list, feature_tap) if scene_list else scene_list)
+
+    def _filter_highlights(self, video_timeline, feature_tap=None):
+        """drop the scenes with the lowest heuristic highlight score before vision analysis
+        Args:
+            video_timeline (list): scenes with "start_frame" and "end_frame"
+            feature_tap (HighlightFeatureTap): tap that saw the frames during ingest, None to sample the video again
+        Returns:
+            list: remaining scenes in time order with "highlight_score", all scenes when the filter is off or scoring fails
+        """
+        if not HIGHLIGHT_FILTER_OPTIONS["enable"]:
+            return video_timeline
+        scene_scores = score_scenes(self.video_path, video_timeline, feature_tap=feature_tap)
+        if not scene_scores:
+            return video_timeline
+        keep = select_highlight_scenes(scene_scores, HIGHLIGHT_FILTER_OPTIONS["drop_percent"])
+        selected = [
+            {**scene, "highlight_score": scene_score["score"]}
+            for scene, scene_score, kept in zip(video_timeline, scene_scores, keep) if kept
+        ]
+        logger.info(f"highlight filter kept {len(selected)} of {len(video_timeline)} scenes for vision analysis")
+        return selected
+
+    def _analyze_sampled_scenes(self, scene_list):
+        """analyze scenes whose frames are already sampled and save video segment info
+        Args:
+            scene_list (list): scenes from ingest_video or sample_timeline_frames
+        """
+        if not scene_list:
+            return None
+
+        def analyze(scene):
+            if not scene['valid']:
+                logger.error(f"scene {scene['start_time']}-{scene['end_time']} is invalid, skip")
+                return None
+            video_scene_info = analyze_sampled_scene(scene)
             if not video_scene_info:
-                logger.error(f"video {video_scene_path} analyze failed, skip")
-                continue
-            video_scene_info.update(video_scene)
-            video_segment_info_list.append(video_scene_info)
+                logger.error(f"scene {scene['start_time']}-{scene['end_time']} analyze failed, skip")
+                return None
+            video_scene_info.update({k: v for k, v in scene.items() if k not in video_scene_info and k not in ('frames', 'valid')})
+            return video_scene_info
+
+        video_segment_info_list = self._map_scenes(analyze, scene_list)
 
         with open(self.video_segment_info_json_path, 'w', encoding='utf-8') as f:
             f.write(json.dumps(video_segment_info_list, ensure_ascii=False, indent=2))
         return True
             
-    def generate_video_scripts(self, perspective=None):
+    def _analyze_stored_scenes(self, frame_store):
+        """analyze every scene of a frame store and save video segment info
+        Args:
+            frame_store (FrameStore): frame store from build_frame_store
+        """
+        if not frame_store:
+            return None
+
+        def analyze(scene_id):
+            scene = frame_store.scenes[scene_id]
+            if not frame_store.is_valid_scene(scene_id):
+                logger.error(f"scene {scene['start_time']}-{scene['end_time']} is invalid, skip")
+                return None
+            video_scene_info = analyze_stored_scene(frame_store, scene_id)
+            if not video_scene_info:
+                logger.error(f"scene {scene['start_time']}-{scene['end_time']} analyze failed, skip")
+                return None
+            video_scene_info.update({k: v for k, v in scene.items() if k not in video_scene_info})
+            return video_scene_info
+
+        video_segment_info_list = self._map_scenes(analyze, range(len(frame_store.scenes)))
+
+        with open(self.video_segment_info_json_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(video_segment_info_list, ensure_ascii=False, indent=2))
+        return True
+
+    def _map_scenes(self, analyze, scenes):
+        """analyze scenes whose frames are already decoded, up to vlm_concurrency at a time
+        Returns:
+            list: video segment info in scene order, skipped scenes removed
+        """
+        if self.vlm_concurrency > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.vlm_concurrency) as executor:
+                results = list(executor.map(analyze, scenes))
+        else:
+            results = [analyze(scene) for scene in scenes]
+        return [video_scene_info for video_scene_info in results if video_scene_info]
+
+    def generate_video_scripts(self, perspective=None, use_cache=True):
         if not os.path.exists(self.video_segment_info_json_path):
             logger.error(f"video segment info json file {self.video_segment_info_json_path} not exist, skip")
             return None
 
-        # 如果指定了视角，使用带视角的文件名
-        script_file_path = self.video_script_json_path
-        if perspective:
-            script_file_path = self.video_script_json_path.replace('.json', f'_{perspective}.json')
+        script_file_path = self._script_file_path(perspective)
 
         if os.path.exists(script_file_path):
             if self.re_generate_scripts:
@@ -94,34 +315,131 @@ class AutoClip(BaseModel):
                 if video_script:
                     return video_script
             
-        with open(self.video_segment_info_json_path, 'r', encoding='utf-8') as f:
-            video_segment_info_list = json.loads(f.read())
-        
         role_desc = DEFAULT_PROMPT['screenwriter_role_desc'][DEFAULT_LANGUAGE]
+        prompt = self._script_prompt(perspective)
         
-        # 根据视角选择不同的提示词
-        if perspective:
-            prompt = self._get_perspective_prompt(video_segment_info_list, perspective)
-        else:
-            prompt = DEFAULT_PROMPT['video_script'][DEFAULT_LANGUAGE].format(video_segment_info_list=json.dumps(video_segment_info_list, ensure_ascii=False, indent=2))
-        
-        # response class
-        class VideoClip(BaseModel):
-            start: float
-            end: float
-            screen_text: str
-            narration: str
-
-        class VideoClipArray(BaseModel):
-            video_clips: List[VideoClip]
-
-        script = get_gpt_response(prompt, response_format=VideoClipArray.model_json_schema(), role_desc=role_desc)
+        script = get_gpt_response(prompt, response_format=VideoClipArray.model_json_schema(), role_desc=role_desc, use_cache=use_cache)
         if script:
             with open(script_file_path, 'w', encoding='utf-8') as f:
                 f.write(json.dumps(script['video_clips'], ensure_ascii=False, indent=2))
             return script['video_clips']
         return None
         
+    def _script_prompt(self, perspective=None):
+        """video script prompt of a perspective built from the video segment info"""
+        with open(self.video_segment_info_json_path, 'r', encoding='utf-8') as f:
+            video_segment_info_list = json.loads(f.read())
+
+        # 根据视角选择不同的提示词
+        if perspective:
+            template = self._perspective_template(perspective)
+        else:
+            template = DEFAULT_PROMPT['video_script'][DEFAULT_LANGUAGE]
+        render_prompt = lambda segments: template.format(video_segment_info_list=dump_segment_info(segments))
+        video_segment_info_list = self._retrieve_segments(video_segment_info_list, [perspective or 'default'])
+        # 长视频超出上下文时先分块摘要
+        return render_prompt(compress_segments(video_segment_info_list, render_prompt))
+
+    def _retrieve_segments(self, video_segment_info_list, perspectives):
+        """scenes most relevant to the perspectives when scene retrieval is enabled, all scenes otherwise"""
+        if not SCENE_RETRIEVAL_OPTIONS["enable"]:
+            return video_segment_info_list
+        queries = [PERSPECTIVE_QUERIES.get(perspective, {}).get(DEFAULT_LANGUAGE, perspective) for perspective in perspectives]
+        return retrieve_segments(video_segment_info_list, queries, self.scene_index_path)
+
+    def _script_file_path(self, perspective=None):
+        """video script json path of a perspective"""
+        # 如果指定了视角，使用带视角的文件名
+        if perspective:
+            return self.video_script_json_path.replace('.json', f'_{perspective}.json')
+        return self.video_script_json_path
+
+    def generate_video_scripts_batch(self, perspectives):
+        """generate the scripts of several perspectives with one chat call per perspective_batch_size perspectives,
+        the segment list is sent once per call instead of once per perspective;
+        perspectives missing from the response or failing validation fall back to generate_video_scripts
+        Args:
+            perspectives (list): perspective names
+        Returns:
+            dict: {perspective: video clips}
+        """
+        if not os.path.exists(self.video_segment_info_json_path):
+            logger.error(f"video segment info json file {self.video_segment_info_json_path} not exist, skip")
+            return {}
+
+        scripts = {}
+        pending = []
+        for perspective in perspectives:
+            script_file_path = self._script_file_path(perspective)
+            if os.path.exists(script_file_path) and not self.re_generate_scripts:
+                with open(script_file_path, 'r', encoding='utf-8') as f:
+                    video_script = json.loads(f.read())
+                if video_script:
+                    scripts[perspective] = video_script
+                    continue
+            pending.append(perspective)
+
+        if pending:
+            with open(self.video_segment_info_json_path, 'r', encoding='utf-8') as f:
+                video_segment_info_list = json.loads(f.read())
+            batch_size = self.perspective_batch_size or len(pending)
+            for i in range(0, len(pending), batch_size):
+                scripts.update(self._generate_perspective_batch(video_segment_info_list, pending[i:i + batch_size]))
+
+        for perspective in pending:
+            if perspective not in scripts:
+                logger.warning(f"perspective {perspective} failed in batch, fall back to a single call")
+                video_script = self.generate_video_scripts(perspective=perspective)
+                if video_script:
+                    scripts[perspective] = video_script
+        return scripts
+
+    def _generate_perspective_batch(self, video_segment_info_list, perspectives):
+        """one structured output call for several perspectives
+        Returns:
+            dict: {perspective: video clips} of the perspectives that passed validation, also saved to their script files
+        """
+        try:
+            # only the requirements of every perspective, input and output format are stated once in the batch prompt
+            perspective_requirements = "\n\n".join(
+                f"[{perspective}]\n{prompt_requirements(self._perspective_template(perspective))}"
+                for perspective in perspectives
+            )
+            render_prompt = lambda segments: DEFAULT_PROMPT['multi_perspective_script'][DEFAULT_LANGUAGE].format(
+                video_segment_info_list=dump_segment_info(segments),
+                perspective_requirements=perspective_requirements,
+                perspective_names=", ".join(perspectives),
+            )
+            video_segment_info_list = self._retrieve_segments(video_segment_info_list, perspectives)
+            prompt = render_prompt(compress_segments(video_segment_info_list, render_prompt))
+            PerspectiveScripts = create_model('PerspectiveScripts', **{perspective: (List[VideoClip], ...) for perspective in perspectives})
+            role_desc = DEFAULT_PROMPT['screenwriter_role_desc'][DEFAULT_LANGUAGE]
+            response = get_gpt_response(prompt, response_format=PerspectiveScripts.model_json_schema(), role_desc=role_desc)
+        except Exception as e:
+            logger.error(f"generate perspective batch {perspectives} failed: {str(e)}")
+            return {}
+        if not isinstance(response, dict):
+            logger.error(f"generate perspective batch {perspectives} failed: {response}")
+            return {}
+
+        # validate every perspective on its own, one bad script does not discard the others
+        clips_adapter = TypeAdapter(List[VideoClip])
+        scripts = {}
+        for perspective in perspectives:
+            try:
+                video_clips = clips_adapter.validate_python(response.get(perspective))
+            except ValidationError as e:
+                logger.warning(f"perspective {perspective} script is invalid: {e.error_count()} errors")
+                continue
+            if not video_clips:
+                continue
+            video_script = [clip.model_dump() for clip in video_clips]
+            with open(self._script_file_path(perspective), 'w', encoding='utf-8') as f:
+                f.write(json.dumps(video_script, ensure_ascii=False, indent=2))
+            scripts[perspective] = video_script
+        logger.info(f"generated {len(scripts)} of {len(perspectives)} perspective scripts in one call")
+        return scripts
+
     def generate_segment_video_by_script(self, video_script, index, output_folder):
         """generate segment video by video script
         Args:
@@ -197,15 +515,8 @@ class AutoClip(BaseModel):
         with open(script_file_path, 'r', encoding='utf-8') as f:
             video_scripts = json.load(f)
         
-        # 为不同视角创建不同的输出文件夹
-        output_folder = f"{self.temp_dir}video_segment/"
-        if perspective:
-            output_folder = f"{self.temp_dir}video_segment_{perspective}/"
-            
-        if os.path.isdir(output_folder):
-            shutil.rmtree(output_folder, ignore_errors=True)
-        os.makedirs(output_folder, exist_ok=True)
-        
+        output_folder = self._segment_output_folder(perspective)
+
         logger.info(f"Starting concurrent processing for {len(video_scripts)} segments with perspective: {perspective or 'default'}")
         with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
             future_to_script = {
@@ -227,17 +538,93 @@ class AutoClip(BaseModel):
         logger.info(f"Completed processing for all {len(processed_scripts)} segments")
         return processed_scripts
     
+    def _segment_output_folder(self, perspective=None):
+        """create an empty segment output folder"""
+        # 为不同视角创建不同的输出文件夹
+        output_folder = f"{self.temp_dir}video_segment/"
+        if perspective:
+            output_folder = f"{self.temp_dir}video_segment_{perspective}/"
+            
+        if os.path.isdir(output_folder):
+            shutil.rmtree(output_folder, ignore_errors=True)
+        os.makedirs(output_folder, exist_ok=True)
+        return output_folder
+
+    def generate_segment_video_streaming(self, perspective=None):
+        """generate the video script as a stream and start TTS + cut + merge of every clip as soon as it is complete,
+        instead of waiting for the whole script; an existing script file is rendered the normal way
+        a stream that ends early, has invalid clips or no clips falls back to generate_video_scripts, a partial script is never output
+        Returns:
+            list: processed video scripts, the script is also saved to its script file
+        """
+        if not os.path.exists(self.video_segment_info_json_path):
+            logger.error(f"video segment info json file {self.video_segment_info_json_path} not exist, skip")
+            return None
+
+        script_file_path = self._script_file_path(perspective)
+        if os.path.exists(script_file_path) and not self.re_generate_scripts:
+            return self.generate_segment_video(perspective=perspective)
+
+        role_desc = DEFAULT_PROMPT['screenwriter_role_desc'][DEFAULT_LANGUAGE]
+        prompt = self._script_prompt(perspective)
+        output_folder = self._segment_output_folder(perspective)
+
+        parser = ClipStreamParser()
+        video_scripts = []
+        invalid_clips = 0
+        future_to_script = {}
+        start_time = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
+            try:
+                for delta in stream_gpt_response(prompt, response_format=VideoClipArray.model_json_schema(), role_desc=role_desc):
+                    for clip in parser.feed(delta):
+                        try:
+                            video_script = VideoClip.model_validate(clip).model_dump()
+                        except ValidationError as e:
+                            logger.warning(f"skip invalid streamed clip: {e.error_count()} errors")
+                            invalid_clips += 1
+                            continue
+                        video_scripts.append(video_script)
+                        logger.info(f"clip {len(video_scripts)} streamed after {time.time() - start_time:.2f}s, start rendering")
+                        future = executor.submit(self.generate_segment_video_by_script, dict(video_script), len(video_scripts), output_folder)
+                        future_to_script[future] = video_script
+            except Exception as e:
+                logger.error(f"stream video script failed after {len(video_scripts)} clips: {str(e)}")
+
+            processed_scripts = []
+            for future in concurrent.futures.as_completed(future_to_script):
+                original_script = future_to_script[future]
+                try:
+                    processed_scripts.append(future.result())
+                except Exception as e:
+                    logger.error(f"Task failed with exception: {e}")
+                    processed_scripts.append(original_script)
+
+        if not parser.closed or invalid_clips or not video_scripts:
+            # 不完整的脚本（流提前结束、有无效片段或没有片段）不作为输出，改用非流式调用重新生成完整脚本
+            logger.error(f"video script stream of perspective {perspective or 'default'} is incomplete, closed: {parser.closed}, "
+                         f"valid clips: {len(video_scripts)}, invalid clips: {invalid_clips}, fall back to a non-streaming script")
+            # a closed stream cached its response, sample a fresh one instead of reading it back
+            if not self.generate_video_scripts(perspective=perspective, use_cache=not parser.closed):
+                return None
+            return self.generate_segment_video(perspective=perspective)
+        with open(script_file_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(video_scripts, ensure_ascii=False, indent=2))
+        logger.info(f"Completed streaming processing for {len(processed_scripts)} segments in {time.time() - start_time:.2f}s")
+        return processed_scripts
+
     def _get_perspective_prompt(self, video_segment_info_list, perspective):
         """根据不同视角生成对应的提示词"""
+        return self._perspective_template(perspective).format(
+            video_segment_info_list=dump_segment_info(video_segment_info_list)
+        )
+
+    def _perspective_template(self, perspective):
+        """视角提示词模板"""
         if perspective in MULTI_PERSPECTIVE_PROMPTS:
-            return MULTI_PERSPECTIVE_PROMPTS[perspective][DEFAULT_LANGUAGE].format(
-                video_segment_info_list=json.dumps(video_segment_info_list, ensure_ascii=False, indent=2)
-            )
-        else:
-            # 默认使用原有的提示词
-            return DEFAULT_PROMPT['video_script'][DEFAULT_LANGUAGE].format(
-                video_segment_info_list=json.dumps(video_segment_info_list, ensure_ascii=False, indent=2)
-            )
+            return MULTI_PERSPECTIVE_PROMPTS[perspective][DEFAULT_LANGUAGE]
+        # 默认使用原有的提示词
+        return DEFAULT_PROMPT['video_script'][DEFAULT_LANGUAGE]
     
     def generate_multiple_perspective_videos(self, perspectives=None):
         """生成多个不同视角的视频"""
@@ -245,12 +632,27 @@ class AutoClip(BaseModel):
             perspectives = ['default', 'emotional', 'educational', 'entertaining', 'inspirational', 'aesthetic', 'trending', 'lifestyle', 'professional', 'storytelling']
         
         results = []
+
+        # 批量模式：一次调用生成多个视角的脚本
+        batch_scripts = self.generate_video_scripts_batch(perspectives) if self.batch_perspectives else None
         
         for perspective in perspectives:
             logger.info(f"Processing perspective: {perspective}")
             
+            # 流式模式：脚本边生成边渲染片段
+            if self.stream_scripts and batch_scripts is None:
+                processed_scripts = self.generate_segment_video_streaming(perspective=perspective)
+                if not processed_scripts:
+                    logger.error(f"Failed to generate segments for perspective: {perspective}")
+                    continue
+                self._concat_perspective_video(perspective, processed_scripts, results)
+                continue
+
             # 1. 生成该视角的脚本
-            video_scripts = self.generate_video_scripts(perspective=perspective)
+            if batch_scripts is not None:
+                video_scripts = batch_scripts.get(perspective)
+            else:
+                video_scripts = self.generate_video_scripts(perspective=perspective)
             if not video_scripts:
                 logger.error(f"Failed to generate scripts for perspective: {perspective}")
                 continue
@@ -262,31 +664,36 @@ class AutoClip(BaseModel):
                 continue
             
             # 3. 合并该视角的视频
-            segments_video_list = [s['final_video_path'] for s in processed_scripts if 'final_video_path' in s]
-            segments_video_list.sort()
-            
-            if segments_video_list:
-                output_video_path = f"{self.temp_dir}{time.strftime('%Y%m%d%H%M%S', time.localtime())}_{perspective}.mp4"
-                res_concat_video = concat_video(segments_video_list, output_video_path)
-                
-                if res_concat_video:
-                    results.append({
-                        'perspective': perspective,
-                        'video_path': output_video_path,
-                        'segments_count': len(segments_video_list)
-                    })
-                    logger.info(f"Successfully generated {perspective} video: {output_video_path}")
-                    
-                    # 清理临时文件
-                    shutil.rmtree(f"{self.temp_dir}video_segment_{perspective}/", ignore_errors=True)
-                else:
-                    logger.error(f"Failed to concat video for perspective: {perspective}")
-            else:
-                logger.error(f"No valid segments found for perspective: {perspective}")
+            self._concat_perspective_video(perspective, processed_scripts, results)
         
         return results
+
+    def _concat_perspective_video(self, perspective, processed_scripts, results):
+        """concat the final segments of a perspective and append the result to results"""
+        segments_video_list = [s['final_video_path'] for s in processed_scripts if 'final_video_path' in s]
+        segments_video_list.sort()
+        
+        if not segments_video_list:
+            logger.error(f"No valid segments found for perspective: {perspective}")
+            return
+        
+        output_video_path = f"{self.temp_dir}{time.strftime('%Y%m%d%H%M%S', time.localtime())}_{perspective}.mp4"
+        res_concat_video = concat_video(segments_video_list, output_video_path)
+        
+        if res_concat_video:
+            results.append({
+                'perspective': perspective,
+                'video_path': output_video_path,
+                'segments_count': len(segments_video_list)
+            })
+            logger.info(f"Successfully generated {perspective} video: {output_video_path}")
+            
+            # 清理临时文件
+            shutil.rmtree(f"{self.temp_dir}video_segment_{perspective}/", ignore_errors=True)
+        else:
+            logger.error(f"Failed to concat video for perspective: {perspective}")
     
-    
+
 if __name__ == "__main__":
     auto_clip = AutoClip(video_path = f"{TEMP_DIR}test.webm")
     
@@ -84,6 +84,68 @@ DEFAULT_PROMPT = {
                 "tag": ["medium-shot", "long-shot", "young woman", "white dress", "park", "lawn", "outdoor", "natural environment", "walking", "bending", "picking up", "jumping", "running", "joyful", "energetic", "sunny", "green"]
             }"""
     },
+    "multi_frame_contact_sheet": {
+        "zh": """这是一个视频片段的帧画面拼图（联系表）：每张图片是一个网格，每个格子是一帧画面，按从左到右、从上到下的顺序排列，对应时间先后。
+            每个格子左上角的黑底白字标注了帧序号和该帧在片段中的时间（分:秒）。如果有多张拼图，序号在下一张拼图中继续。
+            请把这些格子当作同一段视频的连续画面，按序号顺序分析时间序列变化，不要描述网格、边框或标注本身，并以JSON格式返回结果：
+
+            分析要求：
+            1. 观察画面中的动态变化、人物动作、场景转换
+            2. 识别画面主要元素：人物、动物、机器、物体、自然环境、动作
+            3. 注意镜头运动：推拉摇移、景别变化
+            4. 捕捉情感氛围和视觉风格
+
+            返回字段：
+            - desc: 详细描述视频内容，包括场景、人物、动作、变化过程（150-300字，中文）
+            - tag: 精确的标签列表，必须包含以下类别（中文）：
+            * 镜头类型：[特写/近景/中景/远景/全景]
+            * 主体对象：[人物/动物/物体/建筑等]
+            * 场景环境：[室内/室外/城市/自然/等]
+            * 动作行为：[具体的动作描述]
+            * 情感氛围：[欢快/安静/紧张/温馨等]
+            * 视觉风格：[明亮/昏暗/色彩丰富等]
+
+            请直接返回JSON格式，不要包含其他文字。
+            示例格式：{
+                "desc": "一位身穿白色连衣裙的年轻女子在阳光明媚的公园里缓缓走过绿色草坪，她停下脚步弯腰捡起地上的一片落叶，仔细观察后露出微笑，然后轻快地跳跃着向前跑去，整个画面充满了青春活力和自然和谐的美感", 
+                "tag": ["中景", "远景", "年轻女子", "白色连衣裙", "公园", "草坪", "室外", "自然环境", "走路", "弯腰", "捡拾", "跳跃", "奔跑", "欢快", "活力", "阳光明媚", "绿色"]
+            }""",
+        
+        "en": """These are contact sheets of frames from one video segment: every image is a grid, every cell is one frame, ordered left to right and top to bottom in time order.
+            The white-on-black label in the top-left corner of every cell gives the frame number and the time of the frame within the segment (mm:ss). With several sheets, the numbering continues on the next sheet.
+            Treat the cells as consecutive frames of the same video, analyze the temporal changes in frame number order, do not describe the grid, borders or labels themselves, and return the result in JSON format:
+
+            Analysis Requirements:
+            1. Observe dynamic changes, character actions, scene transitions
+            2. Identify main elements: people, objects, environment, actions
+            3. Notice camera movements: push/pull/pan/tilt, shot size changes
+            4. Capture emotional atmosphere and visual style
+
+            Return Fields:
+            - desc: Detailed description of video content, including scenes, characters, actions, and change processes (150-200 words, in English)
+            - tag: Precise tag list, must include the following categories (in English):
+            * Shot types: [close-up/medium-shot/long-shot/wide-shot]
+            * Main subjects: [person/animal/object/building/etc.]
+            * Scene environment: [indoor/outdoor/urban/nature/etc.]
+            * Actions/behaviors: [specific action descriptions]
+            * Emotional atmosphere: [joyful/calm/tense/warm/etc.]
+            * Visual style: [bright/dim/colorful/etc.]
+
+            Please return JSON format directly, without any additional text.
+            Example format: {
+                "desc": "A young woman in a white dress walks slowly across a green lawn in a sunny park. She stops to bend down and pick up a fallen leaf, examines it carefully with a smile, then jumps and runs forward playfully. The entire scene is filled with youthful vitality and natural harmony.", 
+                "tag": ["medium-shot", "long-shot", "young woman", "white dress", "park", "lawn", "outdoor", "natural environment", "walking", "bending", "picking up", "jumping", "running", "joyful", "energetic", "sunny", "green"]
+            }"""
+    },
+
+    # appended to the frame prompts by the resolution ladder
+    "confidence_field": {
+        "zh": """
+            另外在JSON中返回 confidence 字段：0到1之间的数字，表示你对画面内容看得是否清楚、描述是否准确的把握，画面太小或太模糊看不清细节时给出较低的值。""",
+        "en": """
+            Also return a confidence field in the JSON: a number between 0 and 1 for how clearly you can see the content and how sure you are of the description, give a low value when the images are too small or blurry to make out details."""
+    },
+
     "video_script": {
         "zh": """根据以下视频分段信息，创作一个精彩的短视频脚本，总时长控制在15-30秒：
             视频分段信息如下：
@@ -134,6 +196,66 @@ DEFAULT_PROMPT = {
             Reference example format: [{{"start": 10.5, "end": 15.2, "screen_text": "Stunning Opening", "narration": "You are about to witness an amazing scene"}}]
         """,
     },
+    "multi_perspective_script": {
+        "zh": """根据以下视频分段信息，为每个视角分别创作一个短视频脚本：
+            视频分段信息如下：
+            {video_segment_info_list}
+            
+            各视角的创作要求如下，其中的"视频分段信息"均指上方的视频分段信息：
+            {perspective_requirements}
+            
+            **重要：请严格按照JSON格式输出，不要包含任何其他文字、解释或markdown标记**
+            
+            输出一个JSON对象，键为视角名称（{perspective_names}），值为该视角的脚本数组，数组中每个对象包含以下字段：
+            - start: 原视频裁切开始时间（数字，单位秒）
+            - end: 原视频裁切结束时间（数字，单位秒）
+            - screen_text: 显示在屏幕上的文字（字符串，可为空字符串""）
+            - narration: TTS旁白内容（字符串，可为空字符串""）
+            
+            参照示例格式：{{"emotional": [{{"start": 10.5, "end": 15.2, "screen_text": "温暖瞬间", "narration": "这一刻，时间仿佛静止"}}]}}
+        """,
+        "en": """Based on the following video segment information, create one short video script for each perspective:
+            Video segment information:
+            {video_segment_info_list}
+            
+            Requirements of each perspective, "video segment information" in them always refers to the information above:
+            {perspective_requirements}
+            
+            **Important: Please output strictly in JSON format, without any other text, explanations, or markdown markers**
+            
+            Output one JSON object, its keys are the perspective names ({perspective_names}) and each value is the script array of that perspective, each object in the array contains the following fields:
+            - start: Original video clip start time (number, in seconds)
+            - end: Original video clip end time (number, in seconds)
+            - screen_text: Text displayed on screen (string, can be empty string "")
+            - narration: TTS voiceover content (string, can be empty string "")
+            
+            Reference example format: {{"emotional": [{{"start": 10.5, "end": 15.2, "screen_text": "Warm Moment", "narration": "In this moment, time seems to stand still"}}]}}
+        """,
+    },
+    "segment_summary": {
+        "zh": """以下是一个长视频中连续的一部分视频分段信息：
+            {video_segment_info_list}
+            
+            请从中挑选最多{candidate_count}个最精彩、最适合剪辑进短视频的片段，并为每个片段评分。要求：
+            1. start、end 为原视频中的时间（数字，单位秒），必须落在上述分段的时间范围内，可以合并相邻分段
+            2. desc 用一两句话概括片段内容，tag 保留最重要的标签
+            3. score 为0到10的分数，越精彩、越有吸引力分数越高
+            4. summary 用一两句话概括这部分视频的整体内容
+            
+            **重要：请严格按照JSON格式输出，不要包含任何其他文字、解释或markdown标记**
+        """,
+        "en": """The following is a consecutive part of the video segment information of a long video:
+            {video_segment_info_list}
+            
+            Please pick at most {candidate_count} of the most exciting segments that are best suited for a short video, and score each of them. Requirements:
+            1. start and end are times in the original video (numbers, in seconds), they must fall within the time range of the segments above, adjacent segments may be merged
+            2. desc summarizes the clip in one or two sentences, tag keeps the most important tags
+            3. score is a number from 0 to 10, higher for more exciting and attractive clips
+            4. summary sums up this part of the video in one or two sentences
+            
+            **Important: Please output strictly in JSON format, without any other text, explanations, or markdown markers**
+        """,
+    },
 }
 
 # 多视角视频脚本生成提示词
@@ -649,4 +771,48 @@ MULTI_PERSPECTIVE_PROMPTS = {
             Reference example format: [{{"start": 1.5, "end": 6.5, "screen_text": "Story Begins", "narration": "It was an ordinary afternoon, no one expected what would happen next..."}}]
         """
     }
-}
\ No newline at end of file
+}
+
+# 视角检索查询：检索与视角最相关的视频分段
+PERSPECTIVE_QUERIES = {
+    "default": {
+        "zh": "精彩 有吸引力 亮点 高潮 关键时刻 动作 人物 表情",
+        "en": "exciting attractive highlight climax key moment action people expression",
+    },
+    "emotional": {
+        "zh": "温暖 感动 怀念 治愈 家庭 友情 爱情 宠物 拥抱 微笑 泪水",
+        "en": "warm touching nostalgic healing family friendship love pet hug smile tears",
+    },
+    "educational": {
+        "zh": "知识 讲解 演示 步骤 原理 实验 工具 文字 图表 操作",
+        "en": "knowledge explanation demonstration steps principle experiment tool text chart operation",
+    },
+    "entertaining": {
+        "zh": "搞笑 有趣 意外 夸张 欢乐 游戏 表演 笑声 反转",
+        "en": "funny fun surprise exaggerated joyful game performance laughter twist",
+    },
+    "inspirational": {
+        "zh": "努力 坚持 挑战 突破 成功 运动 训练 胜利 梦想",
+        "en": "effort perseverance challenge breakthrough success sport training victory dream",
+    },
+    "aesthetic": {
+        "zh": "美丽 风景 光影 色彩 构图 天空 自然 城市 日落 夜景",
+        "en": "beautiful scenery light and shadow colour composition sky nature city sunset night view",
+    },
+    "trending": {
+        "zh": "热门 潮流 新奇 挑战 打卡 网红 美食 时尚 流行",
+        "en": "popular trend novel challenge check-in influencer food fashion viral",
+    },
+    "lifestyle": {
+        "zh": "日常 生活 美食 旅行 家居 购物 朋友 休闲 早晨",
+        "en": "daily life food travel home shopping friends leisure morning",
+    },
+    "professional": {
+        "zh": "专业 技术 设备 工作 会议 产品 细节 数据 分析",
+        "en": "professional technical equipment work meeting product detail data analysis",
+    },
+    "storytelling": {
+        "zh": "故事 开端 冲突 转折 结局 人物 对话 场景变化 情节",
+        "en": "story beginning conflict turning point ending character dialogue scene change plot",
+    },
+}
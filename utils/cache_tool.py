@@ -0,0 +1,107 @@
+# -*- coding: UTF-8 -*-
+# cache_tool.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from config import RESPONSE_CACHE_OPTIONS
+from logger import logger
+
+
+def make_cache_key(**parts) -> str:
+    """sha256 of the canonical json of all request parts"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def hash_content(data) -> str:
+    """sha256 of image content, str is hashed as utf-8"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResponseCache:
+    """persistent model response cache in sqlite, least recently used entries are evicted above max_bytes"""
+
+    def __init__(self, db_path: str, max_bytes: int):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str):
+        """cached value or None, a hit refreshes the entry"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+                self.hits += 1
+            logger.info(f"response cache hit, hits: {self.hits}, misses: {self.misses}")
+            return json.loads(row[0])
+        except Exception as e:
+            logger.error(f"response cache get failed: {str(e)}")
+            return None
+
+    def set(self, key: str, value):
+        """store a json serializable value and evict least recently used entries above max_bytes"""
+        try:
+            data = json.dumps(value, ensure_ascii=False)
+            size = len(data.encode('utf-8'))
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, data, size, time.time()),
+                )
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_bytes:
+                    evicted = 0
+                    for old_key, old_size in conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                        total -= old_size
+                        evicted += 1
+                    logger.info(f"response cache evicted {evicted} entries")
+                conn.commit()
+        except Exception as e:
+            logger.error(f"response cache set failed: {str(e)}")
+
+    def stats(self) -> dict:
+        """{"hits", "misses", "entries", "bytes"}"""
+        with self._lock:
+            entries, total = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+    def clear(self):
+        """drop all entries"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_OPTIONS["path"], RESPONSE_CACHE_OPTIONS["max_mb"] * 1024 * 1024)
@@ -29,7 +29,8 @@ def retry_decorator(max_retries: int = 3, delay: float = 1.0):
                     retries += 1
                     if retries == max_retries:
                         raise e
-                    time.sleep(delay)
+                    # the ollama gateway already failed over across hosts, retry_after asks to wait for a health probe
+                    time.sleep(max(delay, getattr(e, "retry_after", 0)))
             # 这行代码理论上永远不会执行到，因为循环要么返回要么抛异常
         return wrapper
     return decorator
@@ -0,0 +1,628 @@
+# -*- coding: UTF-8 -*-
+# frame_tool.py
+
+import os
+import cv2
+import json
+import math
+import shutil
+import subprocess
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+from logger import logger
+
+
+def snap_to_keyframe(frame_number: int, keyframe_frames: np.ndarray, tolerance: int, limit: Optional[int] = None) -> int:
+    """move a seek target onto the first keyframe at or just after it,
+    so cap.set(cv2.CAP_PROP_POS_FRAMES) does not decode a whole GOP for one frame
+    Args:
+        frame_number: seek target frame
+        keyframe_frames: sorted keyframe frame numbers
+        tolerance: max frames the target may move forward
+        limit: target must stay below this frame, default no limit
+    Returns:
+        int: keyframe frame number, or the original target when no keyframe is close enough
+    """
+    i = int(np.searchsorted(keyframe_frames, frame_number))
+    if i < len(keyframe_frames):
+        keyframe_number = int(keyframe_frames[i])
+        if keyframe_number - frame_number <= tolerance and (limit is None or keyframe_number < limit):
+            return keyframe_number
+    return frame_number
+
+
+class FrameSampler(ABC):
+    """sample frames start_frame, start_frame + step, ... below end_frame from a video
+    every backend yields (frame_number, frame) with the frame resized to target_width,
+    backends are interchangeable: they yield the same frame numbers for the same arguments
+    """
+    name = ""
+
+    def __init__(self, video_path: str, target_width: Optional[int] = None):
+        self.video_path = video_path
+        self.target_width = target_width
+        cap = cv2.VideoCapture(video_path)
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+    def output_size(self) -> tuple[int, int]:
+        """(width, height) of sampled frames"""
+        if self.target_width and self.width > self.target_width:
+            return self.target_width, int(self.height * self.target_width / self.width)
+        return self.width, self.height
+
+    def _resize(self, frame: np.ndarray) -> np.ndarray:
+        size = self.output_size()
+        if size[0] != frame.shape[1]:
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return frame
+
+    @abstractmethod
+    def sample(self, start_frame: int, end_frame: int, step: int) -> Iterator[tuple[int, np.ndarray]]:
+        """yield (frame_number, frame) of start_frame, start_frame + step, ... below end_frame"""
+
+
+class SeekFrameSampler(FrameSampler):
+    """seek before every sample, cheap for sparse samples
+    """
+    name = "seek"
+
+    def __init__(self, video_path: str, target_width: Optional[int] = None, keyframe_frames: Optional[np.ndarray] = None):
+        super().__init__(video_path, target_width)
+        self.keyframe_frames = keyframe_frames
+
+    def sample(self, start_frame: int, end_frame: int, step: int) -> Iterator[tuple[int, np.ndarray]]:
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            for frame_number in range(start_frame, min(end_frame, self.total_frames), step):
+                if self.keyframe_frames is not None:
+                    frame_number = snap_to_keyframe(frame_number, self.keyframe_frames, step // 2, limit=end_frame)
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+                ret, frame = cap.read()
+                if not ret:
+                    logger.warning(f"failed to read frame number: {frame_number}")
+                    continue
+                yield frame_number, self._resize(frame)
+        finally:
+            cap.release()
+
+
+class GrabFrameSampler(FrameSampler):
+    """seek once and decode forward, grab() skipped frames and retrieve() samples
+    """
+    name = "grab"
+
+    def sample(self, start_frame: int, end_frame: int, step: int) -> Iterator[tuple[int, np.ndarray]]:
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            end_frame = min(end_frame, self.total_frames)
+            if start_frame > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            frame_number = start_frame
+            while frame_number < end_frame:
+                if not cap.grab():
+                    break
+                if (frame_number - start_frame) % step == 0:
+                    ret, frame = cap.retrieve()
+                    if ret:
+                        yield frame_number, self._resize(frame)
+                frame_number += 1
+        finally:
+            cap.release()
+
+
+class FfmpegFrameSampler(FrameSampler):
+    """decode in an ffmpeg subprocess, select= and scale= filters emit raw downscaled frames
+    frames are selected by decoded frame index from the seek point, not resampled by timestamp like fps= would,
+    so on constant frame rate videos the frame numbers match the seek and grab backends
+    """
+    name = "ffmpeg"
+
+    def sample(self, start_frame: int, end_frame: int, step: int) -> Iterator[tuple[int, np.ndarray]]:
+        end_frame = min(end_frame, self.total_frames)
+        count = len(range(start_frame, end_frame, step))
+        if count == 0 or self.fps <= 0:
+            return
+        width, height = self.output_size()
+        # seek half a frame early, the first decoded frame with pts at or after it is start_frame despite pts rounding
+        seek_seconds = max(start_frame - 0.5, 0) / self.fps
+        cmd = [
+            "ffmpeg", "-v", "error",
+            "-ss", f"{seek_seconds:.6f}",
+            "-i", self.video_path,
+            "-vf", f"select='not(mod(n\\,{step}))',scale={width}:{height}",
+            "-vsync", "passthrough",
+            "-frames:v", str(count),
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:",
+        ]
+        frame_size = width * height * 3
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            for i in range(count):
+                buffer = proc.stdout.read(frame_size)
+                if len(buffer) < frame_size:
+                    break
+                yield start_frame + i * step, np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
+        finally:
+            proc.stdout.close()
+            proc.kill()
+            proc.wait()
+
+
+FRAME_SAMPLERS = {
+    SeekFrameSampler.name: SeekFrameSampler,
+    GrabFrameSampler.name: GrabFrameSampler,
+    FfmpegFrameSampler.name: FfmpegFrameSampler,
+}
+
+
+def select_frame_sampler(fps: float, step: int, sample_count: int, max_sequential_seconds: float = 4.0) -> str:
+    """pick a sampler backend from the sampling density
+    Args:
+        fps: video fps
+        step: frames between samples
+        sample_count: number of samples
+        max_sequential_seconds: decode forward while samples are at most this many seconds apart
+    Returns:
+        str: sampler name
+    """
+    # a seek decodes from the previous keyframe, decoding forward decodes every skipped frame
+    if sample_count <= 2 or step > fps * max_sequential_seconds:
+        return SeekFrameSampler.name
+    if shutil.which("ffmpeg"):
+        return FfmpegFrameSampler.name
+    return GrabFrameSampler.name
+
+
+def get_frame_sampler(video_path: str, sampler: str = "seek", target_width: Optional[int] = None, step: int = 1, sample_count: int = 0, keyframe_frames: Optional[np.ndarray] = None) -> FrameSampler | None:
+    """create a frame sampler
+    Args:
+        video_path: video path
+        sampler: "seek", "grab", "ffmpeg" or "auto"
+        target_width: resize sampled frames to this width, default keep size
+        step: frames between samples, used by "auto"
+        sample_count: number of samples, used by "auto"
+        keyframe_frames: keyframe index of the video, used by "seek"
+    Returns:
+        FrameSampler | None: sampler
+    """
+    if sampler == "auto":
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        sampler = select_frame_sampler(fps, step, sample_count)
+        logger.debug(f"auto select frame sampler: {sampler}, step: {step}, samples: {sample_count}")
+    if sampler not in FRAME_SAMPLERS:
+        logger.error(f"unsupported frame sampler: {sampler}")
+        return None
+    if sampler == SeekFrameSampler.name:
+        return SeekFrameSampler(video_path, target_width, keyframe_frames=keyframe_frames)
+    return FRAME_SAMPLERS[sampler](video_path, target_width)
+
+
+def _timeline_targets(video_timeline: list[dict], fps: int, video_total_frames: int, interval: int = 0, check_seconds: int = 10) -> tuple[list[dict], dict]:
+    """frames to read from every scene of a timeline
+    same frames is_valid_video and analyze_video_multi_frames read from every scene:
+    one per second for the black frame check, one every (interval + 1) seconds for analysis
+    Returns:
+        tuple: (scenes with "fps", "total_frames" and "duration", {frame_number: (scene index, second, for analysis)})
+    """
+    scene_list = []
+    targets = {}
+    for scene_index, timeline in enumerate(video_timeline):
+        start_frame = timeline["start_frame"]
+        total_frames = min(timeline["end_frame"], video_total_frames) - start_frame
+        duration = total_frames // fps
+        scene_list.append({**timeline, "fps": fps, "total_frames": total_frames, "duration": duration})
+        for offset in range(0, min(fps * check_seconds, total_frames), fps):
+            targets[start_frame + offset] = (scene_index, offset // fps, False)
+        for second in range(0, duration, interval + 1):
+            targets[start_frame + second * fps] = (scene_index, second, True)
+        if duration == 0 and total_frames > 0:
+            # scenes shorter than one second still send their middle frame
+            targets[start_frame + total_frames // 2] = (scene_index, 0, True)
+    return scene_list, targets
+
+
+def _read_targets(cap: cv2.VideoCapture, frame_numbers: list[int], max_gap: int) -> Iterator[tuple[int, np.ndarray]]:
+    """read sorted frame numbers in one forward pass, seek only backwards or over gaps longer than max_gap frames
+    Yields:
+        tuple: (frame_number, frame)
+    """
+    position = 0    # frame number the next grab() returns
+    for frame_number in frame_numbers:
+        if frame_number < position or frame_number - position > max_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            position = frame_number
+        while position < frame_number and cap.grab():
+            position += 1
+        ret, frame = cap.read()
+        position += 1
+        if not ret:
+            logger.warning(f"failed to read frame number: {frame_number}")
+            continue
+        yield frame_number, frame
+
+
+def _brightness(frame: np.ndarray) -> float:
+    """mean brightness, same weights as COLOR_BGR2GRAY"""
+    b, g, r, _ = cv2.mean(frame)
+    return 0.114 * b + 0.587 * g + 0.299 * r
+
+
+def sample_timeline_frames(video_path: str, video_timeline: list[dict], interval: int = 0, target_width: int = 320, jpeg_quality: int = 70, max_gap_seconds: float = 4.0, check_seconds: int = 10, black_threshold: int = 30) -> list[dict] | None:
+    """sample the frames of every scene in one forward pass over the video
+    Args:
+        video_path: video path
+        video_timeline: scene list with "start_frame" and "end_frame", as in video_timeline.json
+        interval: sample interval seconds, default 0
+        target_width: sampled frame width, default 320
+        jpeg_quality: sampled frame jpeg quality, default 70
+        max_gap_seconds: seek instead of decoding forward over gaps longer than this, default 4.0
+        check_seconds: black frame check seconds per scene, default 10
+        black_threshold: brightness threshold of a black frame, default 30
+    Returns:
+        list[dict] | None: scenes in timeline order, every scene has the timeline fields plus
+            "valid", "fps", "total_frames", "duration" and "frames" ([{"second", "frame", "data"}])
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            logger.error(f"open video file failed: {video_path}")
+            return None
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        if fps <= 0:
+            logger.error(f"get video fps failed: {video_path}")
+            return None
+        video_total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        scene_list, targets = _timeline_targets(video_timeline, fps, video_total_frames, interval, check_seconds)
+        brightness_list = [[] for _ in scene_list]
+        for scene in scene_list:
+            scene["frames"] = []
+
+        encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        for frame_number, frame in _read_targets(cap, sorted(targets), int(fps * max_gap_seconds)):
+            scene_index, second, for_analysis = targets[frame_number]
+            brightness_list[scene_index].append(_brightness(frame))
+            if not for_analysis:
+                continue
+
+            height, width = frame.shape[:2]
+            if width > target_width:
+                frame = cv2.resize(frame, (target_width, int(height * target_width / width)), interpolation=cv2.INTER_AREA)
+            _, buffer = cv2.imencode('.jpg', frame, encode_params)
+            scene_list[scene_index]["frames"].append({"second": second, "frame": frame_number, "data": buffer.tobytes()})
+
+        for scene, brightness in zip(scene_list, brightness_list):
+            scene["valid"] = any(value >= black_threshold for value in brightness)
+
+        logger.info(f"sampled {len(targets)} frames of {len(scene_list)} scenes in one pass: {video_path}")
+        return scene_list
+    except Exception as e:
+        logger.error(f"sample timeline frames failed: {str(e)}")
+        return None
+    finally:
+        cap.release()
+
+
+# row of the frame store index
+FRAME_STORE_INDEX_DTYPE = np.dtype([
+    ("second", np.int32),
+    ("frame", np.int64),
+    ("scene", np.int32),
+    ("analysis", np.bool_),         # analysis frame, otherwise only read for the black frame check
+    ("brightness", np.float32),     # brightness of the full size frame
+])
+
+
+class FrameStore:
+    """downscaled frames of one video in a read-only memmap, shared zero-copy by every consumer
+    store_dir holds frames.npy (N, height, width, 3) uint8, index.npy (N,) FRAME_STORE_INDEX_DTYPE
+    and meta.json with the source video and the scenes; pickling reopens the memmap by path,
+    so worker processes share the page cache instead of copying frames
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.index = np.load(os.path.join(store_dir, "index.npy"))
+        self.frames = np.load(os.path.join(store_dir, "frames.npy"), mmap_mode="r")
+
+    def __reduce__(self):
+        return FrameStore, (self.store_dir,)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def scenes(self) -> list[dict]:
+        """scenes in timeline order with "fps", "total_frames" and "duration" """
+        return self.meta["scenes"]
+
+    def scene_rows(self, scene_id: int, analysis_only: bool = True) -> np.ndarray:
+        """row numbers of a scene in time order"""
+        mask = self.index["scene"] == scene_id
+        if analysis_only:
+            mask &= self.index["analysis"]
+        return np.flatnonzero(mask)
+
+    def scene_frames(self, scene_id: int, analysis_only: bool = True) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """frames of a scene as memmap views
+        Yields:
+            tuple: (index row, frame)
+        """
+        for row in self.scene_rows(scene_id, analysis_only):
+            yield self.index[row], self.frames[row]
+
+    def is_valid_scene(self, scene_id: int, black_threshold: int = 30) -> bool:
+        """black frame check of a scene, same result as is_valid_video on the scene"""
+        rows = self.scene_rows(scene_id, analysis_only=False)
+        return bool(np.any(self.index["brightness"][rows] >= black_threshold))
+
+
+def build_frame_store(video_path: str, store_dir: str, video_timeline: list[dict], interval: int = 0, target_width: int = 320, max_gap_seconds: float = 4.0, check_seconds: int = 10, regenerate: bool = False) -> FrameStore | None:
+    """decode the sampled frames of every scene once into a memmap frame store
+    Args:
+        video_path: video path
+        store_dir: frame store folder, reused when it was built from the same video and settings
+        video_timeline: scene list with "start_frame" and "end_frame", as in video_timeline.json
+        interval: sample interval seconds, default 0
+        target_width: stored frame width, default 320
+        max_gap_seconds: seek instead of decoding forward over gaps longer than this, default 4.0
+        check_seconds: black frame check seconds per scene, default 10
+        regenerate: rebuild an existing store
+    Returns:
+        FrameStore | None
+    """
+    settings = {
+        "video_path": os.path.abspath(video_path),
+        "interval": interval,
+        "target_width": target_width,
+        "check_seconds": check_seconds,
+        "timeline": [[timeline["start_frame"], timeline["end_frame"]] for timeline in video_timeline],
+    }
+    index_path = os.path.join(store_dir, "index.npy")
+    if os.path.exists(index_path) and not regenerate:
+        try:
+            frame_store = FrameStore(store_dir)
+            if frame_store.meta["settings"] == settings:
+                return frame_store
+        except Exception as e:
+            logger.warning(f"load frame store failed, rebuild: {str(e)}")
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            logger.error(f"open video file failed: {video_path}")
+            return None
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        if fps <= 0:
+            logger.error(f"get video fps failed: {video_path}")
+            return None
+        video_total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if width > target_width:
+            width, height = target_width, int(height * target_width / width)
+
+        scene_list, targets = _timeline_targets(video_timeline, fps, video_total_frames, interval, check_seconds)
+
+        # the index is written last, a store without it is incomplete
+        os.makedirs(store_dir, exist_ok=True)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        frame_numbers = sorted(targets)
+        frames = np.lib.format.open_memmap(os.path.join(store_dir, "frames.npy"), mode="w+", dtype=np.uint8, shape=(len(frame_numbers), height, width, 3))
+        index = np.zeros(len(frame_numbers), dtype=FRAME_STORE_INDEX_DTYPE)
+        count = 0
+        for frame_number, frame in _read_targets(cap, frame_numbers, int(fps * max_gap_seconds)):
+            scene_index, second, for_analysis = targets[frame_number]
+            index[count] = (second, frame_number, scene_index, for_analysis, _brightness(frame))
+            if frame.shape[:2] != (height, width):
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            frames[count] = frame
+            count += 1
+        frames.flush()
+        del frames
+
+        with open(os.path.join(store_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "fps": fps, "frame_count": count, "scenes": scene_list}, f, ensure_ascii=False, indent=2)
+        # unreadable frames leave unused rows at the end of frames.npy
+        np.save(index_path, index[:count])
+
+        logger.info(f"built frame store of {count} frames, {len(scene_list)} scenes: {store_dir}")
+        return FrameStore(store_dir)
+    except Exception as e:
+        logger.error(f"build frame store failed: {str(e)}")
+        return None
+    finally:
+        cap.release()
+
+
+def frame_signatures(frames: list[np.ndarray], hash_size: int = 8, hist_bins: int = 16) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """perceptual signatures of frames, computed for all frames at once
+    Args:
+        frames: BGR frames
+        hash_size: hash side, hash_size * hash_size bits
+        hist_bins: histogram bins per colour channel
+    Returns:
+        tuple: (dhash bits (N, hash_size^2), ahash bits (N, hash_size^2), normalized colour histograms (N, 3 * hist_bins))
+    """
+    count = len(frames)
+    gray_dhash = np.stack([cv2.resize(cv2.cvtColor(f, cv2.COLOR_BGR2GRAY), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA) for f in frames]).astype(np.int16)
+    gray_ahash = np.stack([cv2.resize(cv2.cvtColor(f, cv2.COLOR_BGR2GRAY), (hash_size, hash_size), interpolation=cv2.INTER_AREA) for f in frames]).astype(np.float32)
+    dhash = (gray_dhash[:, :, 1:] > gray_dhash[:, :, :-1]).reshape(count, -1)
+    ahash = (gray_ahash > gray_ahash.mean(axis=(1, 2), keepdims=True)).reshape(count, -1)
+
+    return dhash, ahash, frame_histograms(frames, hist_bins)
+
+
+def frame_histograms(frames: list[np.ndarray], hist_bins: int = 16) -> np.ndarray:
+    """normalized colour histograms of frames, computed for all frames at once
+    Args:
+        frames: BGR frames
+        hist_bins: histogram bins per colour channel
+    Returns:
+        np.ndarray: (N, 3 * hist_bins), every row sums to 1
+    """
+    # per channel histograms of 64x64 thumbnails, one bincount for every frame and channel
+    count = len(frames)
+    thumbs = np.stack([cv2.resize(f, (64, 64), interpolation=cv2.INTER_AREA) for f in frames])
+    bins = thumbs.reshape(count, -1, 3).astype(np.int64) * hist_bins // 256
+    bins += np.arange(3) * hist_bins + np.arange(count)[:, None, None] * 3 * hist_bins
+    hist = np.bincount(bins.ravel(), minlength=count * 3 * hist_bins).reshape(count, 3 * hist_bins)
+    return hist / (64 * 64 * 3)
+
+
+def dedup_frames(frames: list[np.ndarray], hash_threshold: int = 5, hist_threshold: float = 0.1) -> list[int]:
+    """drop frames that look the same as the last kept frame
+    Args:
+        frames: BGR frames in time order
+        hash_threshold: max dHash and aHash hamming distance of a duplicate
+        hist_threshold: max colour histogram distance (0-1) of a duplicate
+    Returns:
+        list[int]: indexes of kept frames, the first frame is always kept
+    """
+    if len(frames) < 2:
+        return list(range(len(frames)))
+    return dedup_signatures(*frame_signatures(frames), hash_threshold=hash_threshold, hist_threshold=hist_threshold)
+
+
+def dedup_signatures(dhash: np.ndarray, ahash: np.ndarray, hist: np.ndarray, hash_threshold: int = 5, hist_threshold: float = 0.1) -> list[int]:
+    """dedup_frames on precomputed frame_signatures, frames do not need to stay in memory
+    Returns:
+        list[int]: indexes of kept frames, the first frame is always kept
+    """
+    if len(hist) < 2:
+        return list(range(len(hist)))
+    kept = [0]
+    for i in range(1, len(hist)):
+        last = kept[-1]
+        duplicate = (
+            np.count_nonzero(dhash[i] != dhash[last]) <= hash_threshold
+            and np.count_nonzero(ahash[i] != ahash[last]) <= hash_threshold
+            and np.abs(hist[i] - hist[last]).sum() / 2 <= hist_threshold
+        )
+        if not duplicate:
+            kept.append(i)
+    return kept
+
+
+def estimate_image_tokens(width: int, height: int, patch_size: int = 28) -> int:
+    """vision tokens of one image, qwen2.5vl merges 14px patches 2x2 into one token per 28x28 block
+    Args:
+        width: image width
+        height: image height
+        patch_size: pixels per token side
+    Returns:
+        int: token count
+    """
+    return math.ceil(width / patch_size) * math.ceil(height / patch_size)
+
+
+def image_budget_from_context(num_ctx: int, width: int, height: int, reserved_tokens: int = 2048, patch_size: int = 28) -> int:
+    """how many images of this size fit into the model context
+    Args:
+        num_ctx: model context tokens
+        width: image width
+        height: image height
+        reserved_tokens: tokens kept for the prompt and the response
+        patch_size: pixels per token side
+    Returns:
+        int: image budget, at least 1
+    """
+    return max(1, (num_ctx - reserved_tokens) // estimate_image_tokens(width, height, patch_size))
+
+
+def select_diverse_frames(frames: list[np.ndarray], budget: int) -> list[int]:
+    """pick at most budget frames that are far apart in colour histogram space (max-min distance)
+    Args:
+        frames: BGR frames in time order
+        budget: max frames, at least one frame is selected
+    Returns:
+        list[int]: selected indexes in time order
+    """
+    budget = max(budget, 1)
+    if len(frames) <= budget:
+        return list(range(len(frames)))
+    return select_diverse_histograms(frame_histograms(frames), budget)
+
+
+def select_diverse_histograms(hist: np.ndarray, budget: int) -> list[int]:
+    """select_diverse_frames on precomputed frame_histograms
+    Returns:
+        list[int]: selected indexes in time order
+    """
+    budget = max(budget, 1)
+    if len(hist) <= budget:
+        return list(range(len(hist)))
+    distance = np.abs(hist[:, None, :] - hist[None, :, :]).sum(axis=-1) / 2
+
+    # start from the first frame, then repeatedly add the frame farthest from everything selected,
+    # selected frames are marked -1 and the loop stops early when only copies of selected frames are left
+    selected = [0]
+    min_distance = distance[0].copy()
+    min_distance[0] = -1
+    while len(selected) < budget:
+        i = int(np.argmax(min_distance))
+        if min_distance[i] <= 0:
+            break
+        selected.append(i)
+        min_distance = np.minimum(min_distance, distance[i])
+        min_distance[selected] = -1
+    return sorted(selected)
+
+
+def format_timestamp(seconds: float) -> str:
+    """mm:ss, hh:mm:ss from one hour"""
+    seconds = int(seconds)
+    hours, minutes = seconds // 3600, seconds // 60 % 60
+    if hours:
+        return f"{hours:d}:{minutes:02d}:{seconds % 60:02d}"
+    return f"{minutes:02d}:{seconds % 60:02d}"
+
+
+def build_contact_sheets(frames: list[np.ndarray], seconds: list[float], columns: int = 3, rows: int = 3, cell_width: int = 320) -> list[np.ndarray]:
+    """tile frames in time order into grid images, every cell is labelled with its number and timestamp
+    Args:
+        frames: BGR frames in time order
+        seconds: timestamp of every frame in seconds from the scene start
+        columns: cells per row
+        rows: max rows per sheet, more frames continue on the next sheet
+        cell_width: cell width, frames are resized to keep their aspect ratio
+    Returns:
+        list[np.ndarray]: contact sheets, the last one only has as many rows as it needs
+    """
+    if not frames:
+        return []
+    height, width = frames[0].shape[:2]
+    cell_height = max(int(round(height * cell_width / width)), 1)
+    font_scale = max(cell_width / 640, 0.35)
+    thickness = max(int(round(font_scale * 2)), 1)
+    per_sheet = columns * rows
+
+    sheets = []
+    for first in range(0, len(frames), per_sheet):
+        batch = frames[first:first + per_sheet]
+        sheet_rows = -(-len(batch) // columns)
+        # 1px dark grid lines keep neighbouring cells apart
+        sheet = np.full((sheet_rows * (cell_height + 1) - 1, columns * (cell_width + 1) - 1, 3), 32, dtype=np.uint8)
+        for i, frame in enumerate(batch):
+            number = first + i
+            if frame.shape[:2] != (cell_height, cell_width):
+                frame = cv2.resize(frame, (cell_width, cell_height), interpolation=cv2.INTER_AREA)
+            top, left = i // columns * (cell_height + 1), i % columns * (cell_width + 1)
+            cell = sheet[top:top + cell_height, left:left + cell_width]
+            cell[:] = frame
+            label = f"{number + 1} {format_timestamp(seconds[number])}"
+            (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            cv2.rectangle(cell, (0, 0), (text_width + 6, text_height + baseline + 6), (0, 0, 0), -1)
+            cv2.putText(cell, label, (3, text_height + 3), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
+        sheets.append(sheet)
+    return sheets
@@ -0,0 +1,363 @@
+# -*- coding: UTF-8 -*-
+# gateway_tool.py
+
+import time
+import queue
+import atexit
+import asyncio
+import itertools
+import threading
+import httpx
+import ollama
+from typing import Iterator
+from config import OLLAMA_HOSTS, OLLAMA_TIMEOUT, OLLAMA_GATEWAY_OPTIONS
+from logger import logger
+
+# lower runs first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+# errors that mean the host, not the request, is broken: try the next host
+FAILOVER_ERRORS = (ConnectionError, httpx.TransportError, ollama.RequestError)
+
+_STREAM_END = object()
+
+
+class NoHealthyHostError(ConnectionError):
+    """every ollama host failed one request, retry_after is a hint for retry_decorator"""
+
+    def __init__(self, message: str, retry_after: float = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class OllamaHost:
+    """one ollama server with its own keep-alive client, in-flight counter and latency EWMA"""
+
+    def __init__(self, url: str, client: ollama.AsyncClient, ewma_alpha: float = 0.3):
+        self.url = url
+        self.client = client
+        self.ewma_alpha = ewma_alpha
+        self.in_flight = 0
+        self.model_in_flight = {}
+        self.latency = None
+        self.healthy = True
+        self.models = []
+        self.active_model = None    # model the host serves now, assumed resident on its gpu
+        self.active_since = 0.0
+        self.swaps = 0
+
+    def record_latency(self, seconds: float):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += self.ewma_alpha * (seconds - self.latency)
+
+    def load_key(self) -> tuple:
+        """least loaded first: fewer in-flight requests, then lower latency"""
+        return self.in_flight, self.latency or 0.0
+
+
+class OllamaGateway:
+    """every ollama chat call goes through one asyncio loop and one keep-alive AsyncClient per host
+    requests wait in a priority queue per model, and at most model_concurrency[model] of them run per host;
+    each request goes to the least loaded healthy host and fails over to the next one on connection errors;
+    with residency, a host drains the requests of its active model before it switches to another model,
+    so a single gpu server does not swap models back and forth, max_hold_seconds keeps other models from starving
+    """
+
+    def __init__(self, hosts: list[str], timeout: float, model_concurrency: dict = None, default_concurrency: int = 1, max_connections: int = 8, keepalive_expiry: float = 60.0, probe_interval: float = 30.0, residency: bool = True, keep_alive: str = "30m", max_hold_seconds: float = 120.0):
+        self.host_urls = hosts
+        self.timeout = timeout
+        self.model_concurrency = model_concurrency or {}
+        self.default_concurrency = default_concurrency
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.probe_interval = probe_interval
+        self.residency = residency
+        self.keep_alive = keep_alive
+        self.max_hold_seconds = max_hold_seconds
+        self._lock = threading.Lock()
+        self._loop = None
+        self._hosts = None
+        self._host_changed = None
+        self._waiting = {}
+        self._lanes = {}
+        self._workers = []
+        self._running = {}
+        self._seq = itertools.count()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """start the gateway loop in a daemon thread on first use"""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="ollama-gateway", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _get_hosts(self) -> list[OllamaHost]:
+        if self._hosts is None:
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+            self._hosts = [OllamaHost(url, ollama.AsyncClient(host=url, timeout=self.timeout, limits=limits)) for url in self.host_urls]
+            if len(self._hosts) > 1:
+                self._workers.append(asyncio.get_running_loop().create_task(self._probe_loop()))
+        return self._hosts
+
+    async def _probe(self, host: OllamaHost):
+        """GET /api/tags, a host is healthy when it answers"""
+        try:
+            response = await asyncio.wait_for(host.client.list(), timeout=min(self.timeout, 10))
+            host.models = [model.model for model in response.models]
+            if not host.healthy:
+                logger.info(f"ollama host {host.url} is healthy again")
+            host.healthy = True
+        except Exception as e:
+            if host.healthy:
+                logger.warning(f"ollama host {host.url} health probe failed: {str(e)}")
+            host.healthy = False
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.gather(*[self._probe(host) for host in self._get_hosts()])
+            await asyncio.sleep(self.probe_interval)
+
+    def _admits(self, host: OllamaHost, model: str) -> bool:
+        """whether host can start one more request of model now"""
+        if host.model_in_flight.get(model, 0) >= max(self.model_concurrency.get(model, self.default_concurrency), 1):
+            return False
+        if not self.residency or host.active_model is None:
+            return True
+        others_waiting = any(count for waiting_model, count in self._waiting.items() if waiting_model != host.active_model)
+        held_too_long = time.monotonic() - host.active_since > self.max_hold_seconds
+        if host.active_model == model:
+            # stop taking more of the active model once others waited long enough, so the host can drain and switch
+            return not (others_waiting and held_too_long)
+        # switch only an idle host whose active model has nothing left to run
+        return host.in_flight == 0 and (self._waiting.get(host.active_model, 0) == 0 or held_too_long)
+
+    async def _acquire_host(self, model: str, tried: set) -> OllamaHost | None:
+        """wait for the best host that admits model, hosts already tried are skipped, unhealthy hosts are the last resort
+        Returns:
+            OllamaHost | None: None when every host was tried
+        """
+        async with self._host_changed:
+            try:
+                while True:
+                    candidates = [host for host in self._get_hosts() if host not in tried]
+                    if not candidates:
+                        return None
+                    if any(host.healthy for host in candidates):
+                        candidates = [host for host in candidates if host.healthy]
+                    admitted = [host for host in candidates if self._admits(host, model)]
+                    if admitted:
+                        # a host that already has the model loaded, then the least loaded one
+                        host = min(admitted, key=lambda host: (host.active_model != model, host.load_key()))
+                        if host.active_model != model:
+                            if host.active_model is not None:
+                                host.swaps += 1
+                                logger.info(f"ollama host {host.url} switches model {host.active_model} -> {model}, swaps: {host.swaps}")
+                            host.active_model = model
+                            host.active_since = time.monotonic()
+                        host.in_flight += 1
+                        host.model_in_flight[model] = host.model_in_flight.get(model, 0) + 1
+                        return host
+                    try:
+                        # hold time passes without any host event
+                        await asyncio.wait_for(self._host_changed.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiting[model] -= 1
+
+    async def _release_host(self, host: OllamaHost, model: str):
+        async with self._host_changed:
+            host.in_flight -= 1
+            host.model_in_flight[model] -= 1
+            self._host_changed.notify_all()
+
+    async def _dispatch(self, method: str, kwargs: dict, on_chunk=None):
+        """send one chat or embed request, failing over across hosts
+        with on_chunk the request is streamed, every chunk is passed to on_chunk while the host is held,
+        a stream that already produced chunks does not fail over
+        """
+        model = kwargs.get("model", "")
+        if self.residency and self.keep_alive:
+            kwargs.setdefault("keep_alive", self.keep_alive)
+        if self._host_changed is None:
+            self._host_changed = asyncio.Condition()
+        tried = set()
+        while True:
+            self._waiting[model] = self._waiting.get(model, 0) + 1
+            host = await self._acquire_host(model, tried)
+            if host is None:
+                raise NoHealthyHostError(f"all {len(tried)} ollama hosts failed", retry_after=self.probe_interval if len(tried) > 1 else 0)
+            tried.add(host)
+            start = time.perf_counter()
+            streamed = False
+            try:
+                if on_chunk is None:
+                    result = await getattr(host.client, method)(**kwargs)
+                else:
+                    result = None
+                    async for chunk in await getattr(host.client, method)(**{**kwargs, "stream": True}):
+                        streamed = True
+                        on_chunk(chunk)
+                host.record_latency(time.perf_counter() - start)
+                host.healthy = True
+                return result
+            except FAILOVER_ERRORS as e:
+                host.healthy = False
+                if streamed:
+                    raise
+                logger.warning(f"ollama host {host.url} failed, fail over: {type(e).__name__} {str(e)}")
+                if len(tried) == len(self._get_hosts()):
+                    raise NoHealthyHostError(f"all {len(tried)} ollama hosts failed, last error: {type(e).__name__} {str(e)}", retry_after=self.probe_interval if len(tried) > 1 else 0) from e
+            finally:
+                await self._release_host(host, model)
+
+    def _lane(self, model: str) -> asyncio.PriorityQueue:
+        """priority queue of a model, its workers are the per model concurrency limit"""
+        queue = self._lanes.get(model)
+        if queue is None:
+            queue = self._lanes[model] = asyncio.PriorityQueue()
+            self._running[model] = 0
+            concurrency = max(self.model_concurrency.get(model, self.default_concurrency), 1) * len(self._get_hosts())
+            self._workers += [asyncio.get_running_loop().create_task(self._worker(model, queue)) for _ in range(concurrency)]
+        return queue
+
+    async def _worker(self, model: str, queue: asyncio.PriorityQueue):
+        while True:
+            _, _, future, method, kwargs, on_chunk = await queue.get()
+            if future.done():
+                continue
+            self._running[model] += 1
+            try:
+                result = await self._dispatch(method, kwargs, on_chunk)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._running[model] -= 1
+
+    async def _enqueue(self, priority: int, kwargs: dict, on_chunk=None, method: str = "chat"):
+        future = asyncio.get_running_loop().create_future()
+        self._lane(kwargs.get("model", "")).put_nowait((priority, next(self._seq), future, method, kwargs, on_chunk))
+        return await future
+
+    async def chat(self, priority: int = PRIORITY_NORMAL, **kwargs):
+        """ollama chat through the gateway, usable from any event loop
+        Args:
+            priority (int): queue priority, lower runs first
+            kwargs: ollama.AsyncClient.chat arguments
+        Returns:
+            ollama.ChatResponse
+        """
+        loop = self._ensure_loop()
+        coroutine = self._enqueue(priority, kwargs)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return await coroutine
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, loop))
+
+    def chat_sync(self, priority: int = PRIORITY_NORMAL, **kwargs):
+        """blocking ollama chat through the gateway, for callers outside an event loop
+        Args:
+            priority (int): queue priority, lower runs first
+            kwargs: ollama.Client.chat arguments
+        Returns:
+            ollama.ChatResponse
+        """
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self._enqueue(priority, kwargs), loop).result()
+
+    def embed_sync(self, priority: int = PRIORITY_NORMAL, **kwargs):
+        """blocking ollama embed through the gateway, queued in the lane of the embedding model
+        Args:
+            priority (int): queue priority, lower runs first
+            kwargs: ollama.Client.embed arguments
+        Returns:
+            ollama.EmbedResponse
+        """
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self._enqueue(priority, kwargs, method="embed"), loop).result()
+
+    async def _close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        for host in self._hosts or []:
+            await host.client.close()
+        self._hosts = None
+        self._host_changed = None
+        self._waiting = {}
+        self._lanes = {}
+        self._workers = []
+        self._running = {}
+
+    def close(self):
+        """stop the workers, close the connection pool and the loop, the next call starts a new one"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), loop).result(timeout=5)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+
+    def chat_stream_sync(self, priority: int = PRIORITY_NORMAL, **kwargs) -> Iterator:
+        """streaming ollama chat through the gateway, for callers outside an event loop
+        Args:
+            priority (int): queue priority, lower runs first
+            kwargs: ollama.Client.chat arguments, stream is forced on
+        Yields:
+            ollama.ChatResponse: chunks as they arrive
+        """
+        loop = self._ensure_loop()
+        chunks = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._enqueue(priority, kwargs, on_chunk=chunks.put), loop)
+        future.add_done_callback(lambda _: chunks.put(_STREAM_END))
+        while True:
+            chunk = chunks.get()
+            if chunk is _STREAM_END:
+                future.result()
+                return
+            yield chunk
+
+    def stats(self) -> dict:
+        """{"models": {model: {"queued", "running"}}, "hosts": {url: {"healthy", "in_flight", "latency", "active_model", "swaps"}}, "swaps"}"""
+        return {
+            "models": {model: {"queued": queue.qsize(), "running": self._running[model]} for model, queue in list(self._lanes.items())},
+            "hosts": {
+                host.url: {"healthy": host.healthy, "in_flight": host.in_flight, "latency": host.latency, "active_model": host.active_model, "swaps": host.swaps}
+                for host in self._hosts or []
+            },
+            "swaps": sum(host.swaps for host in self._hosts or []),
+        }
+
+
+gateway = OllamaGateway(
+    hosts=OLLAMA_HOSTS,
+    timeout=OLLAMA_TIMEOUT,
+    model_concurrency=OLLAMA_GATEWAY_OPTIONS["model_concurrency"],
+    default_concurrency=OLLAMA_GATEWAY_OPTIONS["default_concurrency"],
+    max_connections=OLLAMA_GATEWAY_OPTIONS["max_connections"],
+    keepalive_expiry=OLLAMA_GATEWAY_OPTIONS["keepalive_expiry"],
+    probe_interval=OLLAMA_GATEWAY_OPTIONS["probe_interval"],
+    residency=OLLAMA_GATEWAY_OPTIONS["residency"],
+    keep_alive=OLLAMA_GATEWAY_OPTIONS["keep_alive"],
+    max_hold_seconds=OLLAMA_GATEWAY_OPTIONS["max_hold_seconds"],
+)
+atexit.register(gateway.close)
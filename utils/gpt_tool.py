@@ -7,20 +7,22 @@ import ollama
 import json
 import base64
 from utils.common import retry_decorator
-from config import OLLAMA_HOST, OLLAMA_VISION_MODEL, OLLAMA_CHAT_MODEL, DEFAULT_LANGUAGE, OLLAMA_OPTIONS
+from utils.cache_tool import response_cache, make_cache_key, hash_content
+from utils.gateway_tool import gateway, PRIORITY_NORMAL
+from utils.prompt_tool import estimate_tokens
+from config import OLLAMA_VISION_MODEL, OLLAMA_CHAT_MODEL, OLLAMA_EMBED_MODEL, DEFAULT_LANGUAGE, OLLAMA_OPTIONS
 from sys_prompts import DEFAULT_PROMPT
 from logger import logger
-from config import OLLAMA_TIMEOUT
-
-
-client = ollama.Client(host=OLLAMA_HOST, timeout=OLLAMA_TIMEOUT)
+from config import RESPONSE_CACHE_OPTIONS
 
 
 @retry_decorator(max_retries=3, delay=2)
-def analyze_image(image_path: str, prompt=None, role_desc=None):
+def analyze_image(image_path: str, prompt=None, role_desc=None, use_cache=True, priority=PRIORITY_NORMAL):
     """analyze image
     Args:
         image_paths (list): image path list
+        use_cache (bool): read and write the response cache, False to sample a fresh response
+        priority (int): gateway queue priority, lower runs first
     Returns:
         dict: {"desc": "", "tag": []}
     """
@@ -37,7 +39,13 @@ def analyze_image(image_path: str, prompt=None, role_desc=None):
         
         if not prompt:
             prompt = DEFAULT_PROMPT["one_frame"][DEFAULT_LANGUAGE]
-        response = client.chat(
+
+        cache_key = _cache_key(OLLAMA_VISION_MODEL, role_desc, prompt, images=[image_data], response_format='json') if _use_cache(use_cache) else None
+        if cache_key and (cached := response_cache.get(cache_key)) is not None:
+            return cached
+
+        response = gateway.chat_sync(
+            priority=priority,
             model=OLLAMA_VISION_MODEL,
             messages=[
                 {
@@ -59,6 +67,8 @@ def analyze_image(image_path: str, prompt=None, role_desc=None):
             logger.error(f"analyze image error:{result_text}")
             raise ValueError(f"Invalid result format: {result_text}")
 
+        if cache_key:
+            response_cache.set(cache_key, result)
         return result
             
     except Exception as e:
@@ -67,10 +77,12 @@ def analyze_image(image_path: str, prompt=None, role_desc=None):
 
 
 @retry_decorator(max_retries=3, delay=2)
-def analyze_multi_images(images_data: list, prompt=None, role_desc=None):
+def analyze_multi_images(images_data: list, prompt=None, role_desc=None, use_cache=True, priority=PRIORITY_NORMAL):
     """analyze multi images
     Args:
         images_data (list): image data list
+        use_cache (bool): read and write the response cache, False to sample a fresh response
+        priority (int): gateway queue priority, lower runs first
     Returns:
         dict: {"desc": "", "tag": []}
     """
@@ -81,12 +93,17 @@ def analyze_multi_images(images_data: list, prompt=None, role_desc=None):
         if not prompt:
             prompt = DEFAULT_PROMPT["multi_frame"][DEFAULT_LANGUAGE]
          
+        cache_key = _cache_key(OLLAMA_VISION_MODEL, role_desc, prompt, images=images_data, response_format='json') if _use_cache(use_cache) else None
+        if cache_key and (cached := response_cache.get(cache_key)) is not None:
+            return cached
+
         logger.info(f"start analyze {len(images_data)} images...")
 
         total_size = sum(len(img) for img in images_data)
         logger.info(f"images data total size: {total_size / 1024 / 1024:.2f} MB")
         
-        response = client.chat(
+        response = gateway.chat_sync(
+            priority=priority,
             model=OLLAMA_VISION_MODEL,
             messages=[
                 {
@@ -110,6 +127,8 @@ def analyze_multi_images(images_data: list, prompt=None, role_desc=None):
                 logger.error(f"analyze image error:{result_text}")
                 return None
 
+            if cache_key:
+                response_cache.set(cache_key, result)
             return result
         except json.JSONDecodeError:
             logger.error(f"analyze image error:{result_text}")
@@ -134,19 +153,28 @@ def analyze_multi_images(images_data: list, prompt=None, role_desc=None):
 
 
 @retry_decorator(max_retries=3, delay=2)
-def get_gpt_response(prompt, response_format='', role_desc=None):
+def get_gpt_response(prompt, response_format='', role_desc=None, use_cache=True, priority=PRIORITY_NORMAL):
     """get gpt response
     Args:
         prompt (str): prompt
         response_format (str, optional): format. Defaults to ''.
+        use_cache (bool, optional): read and write the response cache, False to sample a fresh response. Defaults to True.
+        priority (int, optional): gateway queue priority, lower runs first. Defaults to PRIORITY_NORMAL.
     Returns:
         str: response
     """
     try:
         if not role_desc:
             role_desc = DEFAULT_PROMPT["video_edit_role_desc"][DEFAULT_LANGUAGE]
+
+        logger.info(f"chat prompt size: ~{estimate_tokens(role_desc) + estimate_tokens(prompt)} tokens, num_ctx: {OLLAMA_OPTIONS['num_ctx']}")
+
+        cache_key = _cache_key(OLLAMA_CHAT_MODEL, role_desc, prompt, response_format=response_format, options=OLLAMA_OPTIONS) if _use_cache(use_cache) else None
+        if cache_key and (cached := response_cache.get(cache_key)) is not None:
+            return cached
         
-        response = client.chat(
+        response = gateway.chat_sync(
+            priority=priority,
             model=OLLAMA_CHAT_MODEL,
             messages=[
                 {
@@ -165,11 +193,12 @@ def get_gpt_response(prompt, response_format='', role_desc=None):
         try:
             if response_format:
                 result = json.loads(result_text)
-                return result
             else:
                 # remove think content
-                result_text = remove_think_tags(result_text)
-                return result_text
+                result = remove_think_tags(result_text)
+            if cache_key:
+                response_cache.set(cache_key, result)
+            return result
         except json.JSONDecodeError:
             logger.error(f"get gpt response error:{result_text}")
             return None
@@ -179,6 +208,94 @@ def get_gpt_response(prompt, response_format='', role_desc=None):
         raise e
 
 
+@retry_decorator(max_retries=3, delay=2)
+def get_embeddings(texts: list, priority=PRIORITY_NORMAL):
+    """embed texts with the embedding model
+    Args:
+        texts (list): texts
+        priority (int, optional): gateway queue priority, lower runs first. Defaults to PRIORITY_NORMAL.
+    Returns:
+        list: one embedding per text
+    """
+    try:
+        response = gateway.embed_sync(priority=priority, model=OLLAMA_EMBED_MODEL, input=texts)
+        return response['embeddings']
+    except Exception as e:
+        logger.error(f"get embeddings error:{e}")
+        raise e
+
+
+def stream_gpt_response(prompt, response_format='', role_desc=None, use_cache=True, priority=PRIORITY_NORMAL):
+    """stream gpt response text as it is generated
+    the full text is parsed and cached like get_gpt_response once the stream ends,
+    a cache hit yields the cached response in one piece
+    Args:
+        prompt (str): prompt
+        response_format (str, optional): format. Defaults to ''.
+        use_cache (bool, optional): read and write the response cache. Defaults to True.
+        priority (int, optional): gateway queue priority, lower runs first. Defaults to PRIORITY_NORMAL.
+    Yields:
+        str: response text delta
+    """
+    if not role_desc:
+        role_desc = DEFAULT_PROMPT["video_edit_role_desc"][DEFAULT_LANGUAGE]
+
+    logger.info(f"chat prompt size: ~{estimate_tokens(role_desc) + estimate_tokens(prompt)} tokens, num_ctx: {OLLAMA_OPTIONS['num_ctx']}")
+
+    cache_key = _cache_key(OLLAMA_CHAT_MODEL, role_desc, prompt, response_format=response_format, options=OLLAMA_OPTIONS) if _use_cache(use_cache) else None
+    if cache_key and (cached := response_cache.get(cache_key)) is not None:
+        yield json.dumps(cached, ensure_ascii=False) if response_format else cached
+        return
+
+    parts = []
+    for chunk in gateway.chat_stream_sync(
+        priority=priority,
+        model=OLLAMA_CHAT_MODEL,
+        messages=[
+            {
+                'role': 'system',
+                'content': role_desc
+            },
+            {
+                'role': 'user',
+                'content': prompt
+            }
+        ],
+        format=response_format,
+        options=OLLAMA_OPTIONS,
+    ):
+        delta = chunk['message']['content']
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    if not cache_key:
+        return
+    result_text = ''.join(parts).strip()
+    try:
+        result = json.loads(result_text) if response_format else remove_think_tags(result_text)
+        response_cache.set(cache_key, result)
+    except json.JSONDecodeError:
+        logger.error(f"stream gpt response error:{result_text}")
+
+
+def _use_cache(use_cache: bool) -> bool:
+    """response cache is used when enabled in config and not bypassed by the caller"""
+    return use_cache and RESPONSE_CACHE_OPTIONS["enable"]
+
+
+def _cache_key(model, role_desc, prompt, images=None, response_format=None, options=None):
+    """response cache key of one chat request, images are keyed by content hash"""
+    return make_cache_key(
+        model=model,
+        role_desc=role_desc,
+        prompt=prompt,
+        images=[hash_content(image) for image in images or []],
+        format=response_format,
+        options=options,
+    )
+
+
 def remove_think_tags(text):
     """remove think tags
     Args:
@@ -0,0 +1,228 @@
+# -*- coding: UTF-8 -*-
+# highlight_tool.py
+
+import os
+import cv2
+import bisect
+import subprocess
+import numpy as np
+from utils.frame_tool import get_frame_sampler
+from config import HIGHLIGHT_FILTER_OPTIONS
+from logger import logger
+
+HIGHLIGHT_FEATURES = ("motion", "colourfulness", "sharpness", "faces", "loudness")
+LOUDNESS_WINDOW_SECONDS = 0.5
+
+_face_cascade = None
+
+
+def _get_face_cascade():
+    """frontal face haar cascade bundled with opencv, None when the build ships without cascades"""
+    global _face_cascade
+    if _face_cascade is None:
+        cascade_dir = getattr(getattr(cv2, "data", None), "haarcascades", "")
+        cascade_path = os.path.join(cascade_dir, "haarcascade_frontalface_default.xml")
+        cascade = cv2.CascadeClassifier(cascade_path) if os.path.isfile(cascade_path) else None
+        if cascade is None or cascade.empty():
+            logger.warning(f"haar face cascade not found: {cascade_path}, face count is not scored")
+            cascade = False
+        _face_cascade = cascade
+    return _face_cascade or None
+
+
+def _gray(frames: np.ndarray) -> np.ndarray:
+    """float32 gray of bgr frames, same weights as COLOR_BGR2GRAY"""
+    frames = frames.astype(np.float32)
+    return 0.114 * frames[..., 0] + 0.587 * frames[..., 1] + 0.299 * frames[..., 2]
+
+
+def frame_features(frames: np.ndarray) -> dict:
+    """per-frame signal features of a stack of tiny bgr frames
+    Args:
+        frames: (n, h, w, 3) uint8
+    Returns:
+        dict: {"motion", "colourfulness", "sharpness", "faces"}, one float32 array of n values each,
+            motion is the mean absolute gray difference to the previous frame, 0 for the first
+    """
+    gray = _gray(frames)
+    frames = frames.astype(np.float32)
+    b, g, r = frames[..., 0], frames[..., 1], frames[..., 2]
+
+    motion = np.zeros(len(frames), dtype=np.float32)
+    if len(frames) > 1:
+        motion[1:] = np.abs(np.diff(gray, axis=0)).mean(axis=(1, 2))
+
+    # Hasler and Suesstrunk colourfulness
+    rg = r - g
+    yb = 0.5 * (r + g) - b
+    colourfulness = np.sqrt(rg.std(axis=(1, 2)) ** 2 + yb.std(axis=(1, 2)) ** 2) + 0.3 * np.sqrt(rg.mean(axis=(1, 2)) ** 2 + yb.mean(axis=(1, 2)) ** 2)
+
+    sharpness = np.array([cv2.Laplacian(frame, cv2.CV_32F).var() for frame in gray], dtype=np.float32)
+
+    cascade = _get_face_cascade()
+    faces = np.zeros(len(frames), dtype=np.float32)
+    if cascade is not None:
+        gray_u8 = gray.astype(np.uint8)
+        for i, frame in enumerate(gray_u8):
+            faces[i] = len(cascade.detectMultiScale(frame, scaleFactor=1.1, minNeighbors=4, minSize=(12, 12)))
+
+    return {"motion": motion, "colourfulness": colourfulness.astype(np.float32), "sharpness": sharpness, "faces": faces}
+
+
+class HighlightFeatureTap:
+    """frame tap that reduces every sampled frame to its feature values while the video is decoded,
+    only the previous tiny gray frame is kept, so it can ride along the single-pass ingest decode
+    """
+
+    def __init__(self, fps: float, sample_fps: float = None, target_width: int = None):
+        sample_fps = sample_fps or HIGHLIGHT_FILTER_OPTIONS["sample_fps"]
+        self.step = max(int(round(fps / sample_fps)), 1)
+        self.target_width = target_width or HIGHLIGHT_FILTER_OPTIONS["target_width"]
+        self.frame_numbers = []
+        self.rows = []
+        self._previous_gray = None
+
+    def __call__(self, frame_number: int, frame: np.ndarray):
+        if frame_number % self.step != 0:
+            return
+        height, width = frame.shape[:2]
+        if width > self.target_width:
+            frame = cv2.resize(frame, (self.target_width, max(int(height * self.target_width / width), 1)), interpolation=cv2.INTER_AREA)
+        values = frame_features(frame[None])
+        gray = _gray(frame)
+        # motion to the previous sample, the first sample of a scene is left out when scenes are reduced
+        motion = np.abs(gray - self._previous_gray).mean() if self._previous_gray is not None and self._previous_gray.shape == gray.shape else 0
+        self._previous_gray = gray
+        self.frame_numbers.append(frame_number)
+        self.rows.append((motion, values["colourfulness"][0], values["sharpness"][0], values["faces"][0]))
+
+    def scene_features(self, video_timeline: list[dict]) -> dict:
+        """reduce the sampled frame features to one value per scene
+        Returns:
+            dict: {"motion", "colourfulness", "sharpness", "faces"}, one float32 array of scene count values each
+        """
+        rows = np.asarray(self.rows, dtype=np.float32).reshape(-1, 4)
+        features = {name: np.zeros(len(video_timeline), dtype=np.float32) for name in ("motion", "colourfulness", "sharpness", "faces")}
+        for scene_index, timeline in enumerate(video_timeline):
+            first = bisect.bisect_left(self.frame_numbers, timeline["start_frame"])
+            last = bisect.bisect_left(self.frame_numbers, timeline["end_frame"])
+            if last <= first:
+                continue
+            scene_rows = rows[first:last]
+            # motion inside the scene, the cut to the previous scene is not motion
+            features["motion"][scene_index] = scene_rows[1:, 0].mean() if len(scene_rows) > 1 else 0
+            features["colourfulness"][scene_index] = scene_rows[:, 1].mean()
+            features["sharpness"][scene_index] = np.median(scene_rows[:, 2])
+            features["faces"][scene_index] = scene_rows[:, 3].max()
+        return features
+
+
+def audio_loudness(video_path: str, window_seconds: float = LOUDNESS_WINDOW_SECONDS, sample_rate: int = 8000) -> np.ndarray | None:
+    """rms loudness in dBFS of consecutive audio windows, decoded by ffmpeg as mono pcm
+    Returns:
+        np.ndarray | None: one value per window, None without audio or ffmpeg
+    """
+    cmd = [
+        "ffmpeg", "-v", "error", "-i", video_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:",
+    ]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"decode audio failed, loudness is not scored: {str(e)}")
+        return None
+    samples = np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768
+    window = max(int(window_seconds * sample_rate), 1)
+    count = len(samples) // window
+    if count == 0:
+        return None
+    rms = np.sqrt((samples[:count * window].reshape(count, window) ** 2).mean(axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-5))
+
+
+def _rank_normalize(values: np.ndarray) -> np.ndarray:
+    """percentile rank in [0, 1], ties share the average rank"""
+    if len(values) < 2:
+        return np.ones(len(values), dtype=np.float32)
+    order = values.argsort(kind="stable")
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[order] = np.arange(len(values))
+    # average the ranks of equal values
+    _, inverse = np.unique(values, return_inverse=True)
+    ranks = (np.bincount(inverse, weights=ranks) / np.bincount(inverse))[inverse]
+    return (ranks / (len(values) - 1)).astype(np.float32)
+
+
+def score_scenes(video_path: str, video_timeline: list[dict], sample_fps: float = None, target_width: int = None, weights: dict = None, feature_tap: HighlightFeatureTap = None) -> list[dict] | None:
+    """heuristic highlight score of every scene from tiny sampled frames and the audio track
+    every feature is ranked across the scenes, the score is the weighted mean of the ranks of the available features
+    without feature_tap the frames are sampled in an extra forward pass over the video,
+    loudness always comes from a separate audio-only ffmpeg decode
+    Args:
+        video_path: video path
+        video_timeline: scene list with "start_frame" and "end_frame", as in video_timeline.json
+        sample_fps: sampled frames per second, default HIGHLIGHT_FILTER_OPTIONS["sample_fps"]
+        target_width: sampled frame width, default HIGHLIGHT_FILTER_OPTIONS["target_width"]
+        weights: feature weights, default HIGHLIGHT_FILTER_OPTIONS["weights"]
+        feature_tap: tap that already saw the frames of the video, e.g. during ingest_video
+    Returns:
+        list[dict] | None: per scene {"score", "motion", "colourfulness", "sharpness", "faces", "loudness"}
+    """
+    weights = weights or HIGHLIGHT_FILTER_OPTIONS["weights"]
+    if not video_timeline:
+        return []
+
+    try:
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if fps <= 0:
+            logger.error(f"get video fps failed: {video_path}")
+            return None
+        if feature_tap is None:
+            feature_tap = HighlightFeatureTap(fps, sample_fps, target_width)
+            end_frame = min(max(timeline["end_frame"] for timeline in video_timeline), total_frames)
+            sampler = get_frame_sampler(video_path, "auto", target_width=feature_tap.target_width, step=feature_tap.step, sample_count=len(range(0, end_frame, feature_tap.step)))
+            if sampler is None:
+                return None
+            for frame_number, frame in sampler.sample(0, end_frame, feature_tap.step):
+                feature_tap(frame_number, frame)
+
+        features = feature_tap.scene_features(video_timeline)
+        features["loudness"] = np.zeros(len(video_timeline), dtype=np.float32)
+        loudness = audio_loudness(video_path)
+        if loudness is not None:
+            for scene_index, timeline in enumerate(video_timeline):
+                first = int(timeline["start_frame"] / fps / LOUDNESS_WINDOW_SECONDS)
+                last = max(int(timeline["end_frame"] / fps / LOUDNESS_WINDOW_SECONDS), first + 1)
+                window = loudness[first:last]
+                # peaks, not the mean: a short cheer or laugh marks a highlight
+                features["loudness"][scene_index] = np.percentile(window, 90) if len(window) else -100
+
+        missing = {"loudness"} if loudness is None else set()
+        if _get_face_cascade() is None:
+            missing.add("faces")
+        available = [name for name in HIGHLIGHT_FEATURES if weights.get(name, 0) > 0 and name not in missing]
+        ranks = {name: _rank_normalize(features[name]) for name in available}
+        total_weight = sum(weights[name] for name in available) or 1
+        score = sum(weights[name] * ranks[name] for name in available) / total_weight if available else np.zeros(len(video_timeline))
+
+        return [
+            {"score": round(float(score[i]), 4), **{name: round(float(features[name][i]), 4) for name in HIGHLIGHT_FEATURES}}
+            for i in range(len(video_timeline))
+        ]
+    except Exception as e:
+        logger.error(f"score scenes failed: {str(e)}")
+        return None
+
+
+def select_highlight_scenes(scene_scores: list[dict], drop_percent: float) -> list[bool]:
+    """keep mask of scenes above the bottom drop_percent of highlight scores"""
+    if not scene_scores or drop_percent <= 0:
+        return [True] * len(scene_scores or [])
+    scores = np.array([scene_score["score"] for scene_score in scene_scores])
+    drop_count = min(int(len(scores) * drop_percent / 100), len(scores) - 1)
+    keep = np.ones(len(scores), dtype=bool)
+    keep[np.argsort(scores, kind="stable")[:drop_count]] = False
+    return keep.tolist()
@@ -0,0 +1,206 @@
+# -*- coding: UTF-8 -*-
+# ingest_tool.py
+
+import os
+import cv2
+import json
+import bisect
+import numpy as np
+from pathlib import Path
+from scenedetect import SceneManager
+from scenedetect.backends.opencv import VideoStreamCv2
+from scenedetect.detectors import ContentDetector
+from utils.video_tool import get_video_fps, normalize_scene_lengths, set_detect_downscale
+from config import TEMP_DIR, SCENE_LENGTH_OPTIONS
+from logger import logger
+
+
+class _TapVideoStream(VideoStreamCv2):
+    """opencv video stream that hands every decoded frame to a tap function,
+    so scene detection and frame sampling share one decode
+    """
+
+    def __init__(self, path: str, on_frame):
+        super().__init__(path)
+        self._on_frame = on_frame
+
+    def read(self, *args, **kwargs):
+        frame = super().read(*args, **kwargs)
+        if isinstance(frame, np.ndarray):
+            # frame_number is 1-based after a read
+            self._on_frame(self.frame_number - 1, frame)
+        return frame
+
+
+class _FrameCollector:
+    """collect per-frame brightness and downscaled jpeg samples while decoding
+    """
+
+    def __init__(self, fps: int, interval: int = 0, target_width: int = 320, jpeg_quality: int = 70):
+        self.sample_step = fps * (interval + 1)
+        self.target_width = target_width
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.brightness = []
+        self.samples = {}
+
+    def __call__(self, frame_number: int, frame: np.ndarray):
+        # same weights as COLOR_BGR2GRAY, without allocating a gray frame
+        b, g, r, _ = cv2.mean(frame)
+        self.brightness.append(0.114 * b + 0.587 * g + 0.299 * r)
+
+        if frame_number % self.sample_step != 0:
+            return
+        self.add_sample(frame_number, frame)
+
+    def add_sample(self, frame_number: int, frame: np.ndarray):
+        """downscale and encode one sampled frame"""
+        height, width = frame.shape[:2]
+        if width > self.target_width:
+            new_height = int(height * self.target_width / width)
+            frame = cv2.resize(frame, (self.target_width, new_height), interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', frame, self.encode_params)
+        self.samples[frame_number] = buffer.tobytes()
+
+
+def _sample_missing_frames(video_path: str, collector: _FrameCollector, frame_numbers: list[int]):
+    """read frames the sampling grid missed into the collector, e.g. the middle frame of a scene shorter than the sample step"""
+    if not frame_numbers:
+        return
+    cap = cv2.VideoCapture(video_path)
+    try:
+        for frame_number in sorted(frame_numbers):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            ret, frame = cap.read()
+            if not ret:
+                logger.warning(f"failed to read frame number: {frame_number}")
+                continue
+            collector.add_sample(frame_number, frame)
+    finally:
+        cap.release()
+
+
+def _is_valid_scene(brightness: np.ndarray, start_frame: int, end_frame: int, fps: int, check_seconds: int = 10, black_threshold: int = 30) -> bool:
+    """same rule as is_valid_video, applied to the brightness of the source frames
+    Args:
+        brightness: mean brightness of every decoded frame
+        start_frame: scene start frame
+        end_frame: scene end frame
+        fps: video fps
+        check_seconds: check seconds
+        black_threshold: brightness threshold of a black frame
+    Returns:
+        bool: scene is valid
+    """
+    if fps <= 0:
+        return False
+    max_check_frames = min(fps * check_seconds, end_frame - start_frame)
+    checked = brightness[start_frame:min(start_frame + max_check_frames, len(brightness)):fps]
+    return bool(np.any(checked >= black_threshold))
+
+
+def ingest_video(video_path: str, output_folder: str = None, video_timeline_json_path: str = None, threshold: int = 30, downscale_factor: int = 1, interval: int = 0, target_width: int = 320, jpeg_quality: int = 70, check_seconds: int = 10, black_threshold: int = 30, frame_tap=None) -> list[dict] | None:
+    """ingest video in a single decode: scene cuts, black frame verdicts and sampled frames
+    Args:
+        video_path (str): video path
+        output_folder (str, optional): output folder. Defaults to None.
+        video_timeline_json_path (str, optional): video timeline json path. Defaults to None.
+        threshold (int, optional): scene detect threshold. Defaults to 30.
+        downscale_factor (int, optional): scene detect downscale factor, 1 for the auto downscale. Defaults to 1.
+        interval (int, optional): sample interval seconds. Defaults to 0.
+        target_width (int, optional): sampled frame width. Defaults to 320.
+        jpeg_quality (int, optional): sampled frame jpeg quality. Defaults to 70.
+        check_seconds (int, optional): black frame check seconds per scene. Defaults to 10.
+        black_threshold (int, optional): brightness threshold of a black frame. Defaults to 30.
+        frame_tap (callable, optional): also called with (frame_number, frame) of every decoded frame, e.g. a HighlightFeatureTap. Defaults to None.
+    Returns:
+        list[dict] | None: scene list, every scene has the video_timeline.json fields plus
+            "valid", "fps", "total_frames", "duration" and "frames" ([{"second", "frame", "data"}])
+    """
+    if not os.path.exists(video_path):
+        logger.error(f"video not exist: {video_path}")
+        return None
+
+    video_file = Path(video_path)
+    if video_file.suffix not in ['.mp4', '.avi', '.mov', '.mkv', '.webm']:
+        logger.error("unsupported video format, please use MP4, AVI, MOV, MKV or WEBM format")
+        return None
+
+    if not output_folder:
+        output_folder = f"{TEMP_DIR}/{video_file.stem}_clip/"
+    if not output_folder.endswith('/'):
+        output_folder += '/'
+    os.makedirs(output_folder, exist_ok=True)
+
+    if not video_timeline_json_path:
+        video_timeline_json_path = f"{output_folder}video_timeline.json"
+
+    try:
+        fps = get_video_fps(video_path)
+        if not fps or fps <= 0:
+            logger.error(f"get video fps failed: {video_path}")
+            return None
+        collector = _FrameCollector(fps, interval=interval, target_width=target_width, jpeg_quality=jpeg_quality)
+        on_frame = collector
+        if frame_tap is not None:
+            on_frame = lambda frame_number, frame: (collector(frame_number, frame), frame_tap(frame_number, frame))
+        video_stream = _TapVideoStream(video_path, on_frame)
+
+        scene_manager = SceneManager()
+        scene_manager.add_detector(ContentDetector(threshold=threshold))
+        # taps see the full frames, only the detector works on downscaled ones, same scale as split_video_by_scenes
+        set_detect_downscale(scene_manager, downscale_factor)
+        scene_manager.detect_scenes(video=video_stream)
+        scene_timeline_list = scene_manager.get_scene_list()
+
+        if not scene_timeline_list:
+            logger.warning("no scene timeline found")
+            return []
+        scene_timeline_list = normalize_scene_lengths(scene_timeline_list, SCENE_LENGTH_OPTIONS["min_seconds"], SCENE_LENGTH_OPTIONS["max_seconds"])
+
+        brightness = np.asarray(collector.brightness, dtype=np.float32)
+        # the sampling grid runs over the whole video, scenes it misses still send their middle frame
+        sample_frames = sorted(collector.samples)
+        missing = []
+        for scene_timeline in scene_timeline_list:
+            start_frame, end_frame = scene_timeline[0].get_frames(), scene_timeline[1].get_frames()
+            if end_frame > start_frame and bisect.bisect_left(sample_frames, start_frame) == bisect.bisect_left(sample_frames, end_frame):
+                missing.append(start_frame + (end_frame - start_frame) // 2)
+        _sample_missing_frames(video_path, collector, missing)
+        sample_frames = sorted(collector.samples)
+
+        video_timeline_list = []
+        scene_list = []
+        for scene_timeline in scene_timeline_list:
+            start_frame = scene_timeline[0].get_frames()
+            end_frame = scene_timeline[1].get_frames()
+            timeline = {
+                "start_time": scene_timeline[0].get_timecode(),
+                "end_time": scene_timeline[1].get_timecode(),
+                "start_frame": start_frame,
+                "end_frame": end_frame,
+            }
+            valid = _is_valid_scene(brightness, start_frame, end_frame, fps, check_seconds, black_threshold)
+            timeline["valid"] = valid
+            video_timeline_list.append(timeline)
+
+            first, last = bisect.bisect_left(sample_frames, start_frame), bisect.bisect_left(sample_frames, end_frame)
+            frames = [
+                {"second": (n - start_frame) // fps, "frame": n, "data": collector.samples[n]}
+                for n in sample_frames[first:last]
+            ]
+            total_frames = end_frame - start_frame
+            scene_list.append({
+                **timeline,
+                "fps": fps,
+                "total_frames": total_frames,
+                "duration": total_frames // fps,
+                "frames": frames,
+            })
+
+        with open(video_timeline_json_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(video_timeline_list, ensure_ascii=False, indent=2))
+        logger.info(f"video ingest success, scene count: {len(scene_list)}, decoded frames: {len(brightness)}, sampled frames: {len(sample_frames)}")
+        return scene_list
+    except Exception as e:
+        logger.error(f"video ingest error: {str(e)}")
+        return None
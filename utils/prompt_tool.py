@@ -0,0 +1,91 @@
+# -*- coding: UTF-8 -*-
+# prompt_tool.py
+
+import re
+import math
+from collections import Counter
+from config import DEFAULT_LANGUAGE
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """tokenizer-free token estimate of a prompt, on the safe side for qwen models
+    one token per CJK character, one token per 4 characters of other text
+    Args:
+        text (str): prompt text
+    Returns:
+        int: estimated tokens
+    """
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + math.ceil((len(text) - cjk_count) / 4)
+
+
+def timecode_to_seconds(timecode: str) -> float:
+    """HH:MM:SS.mmm to seconds"""
+    hours, minutes, seconds = timecode.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def segment_seconds(segment: dict) -> tuple[float, float]:
+    """(start, end) seconds of a video segment info or script candidate"""
+    if 'start' in segment and 'end' in segment:
+        return float(segment['start']), float(segment['end'])
+    return timecode_to_seconds(segment['start_time']), timecode_to_seconds(segment['end_time'])
+
+
+def prompt_requirements(template: str) -> str:
+    """task line and requirement lines of a script prompt template, for prompts that state the input and the output format once
+    the segment info placeholder, everything before it but the first line, and the output format from the first "**" line on are dropped
+    Args:
+        template (str): script prompt with {video_segment_info_list}, e.g. MULTI_PERSPECTIVE_PROMPTS[perspective][language]
+    Returns:
+        str: requirement text
+    """
+    lines = [line.strip() for line in template.strip().splitlines()]
+    task = lines[0].rstrip('：:')
+    if '{video_segment_info_list}' in lines:
+        lines = lines[lines.index('{video_segment_info_list}') + 1:]
+    output_format = next((i for i, line in enumerate(lines) if line.startswith('**')), len(lines))
+    return "\n".join([task] + [line for line in lines[:output_format] if line])
+
+
+# fallback tags of analyze results without tags, no information for the screenwriter
+_PLACEHOLDER_TAGS = {"video_frames", "base64_encoded"}
+
+_COMPACT_HEADERS = {
+    "zh": {"tags": "标签编号: ", "columns": ["开始(秒)", "结束(秒)", "标签", "描述"], "score": "评分"},
+    "en": {"tags": "tag ids: ", "columns": ["start(s)", "end(s)", "tags", "desc"], "score": "score"},
+}
+
+
+def encode_segments_compact(segments: list, language: str = None) -> str:
+    """segment infos as a table for script prompts
+    one row per segment with start and end seconds rounded to 0.1, tags and desc;
+    frame numbers, fps and frame counts are dropped, tags used by several segments are replaced by #ids
+    Args:
+        segments (list): segment infos or map-reduce candidates
+        language (str): header language, default DEFAULT_LANGUAGE
+    Returns:
+        str: table text
+    """
+    headers = _COMPACT_HEADERS.get(language or DEFAULT_LANGUAGE, _COMPACT_HEADERS["en"])
+    segment_tags = [[tag for tag in dict.fromkeys(segment.get("tag", [])) if tag not in _PLACEHOLDER_TAGS] for segment in segments]
+    tag_counts = Counter(tag for tags in segment_tags for tag in tags)
+    tag_ids = {tag: f"#{i}" for i, tag in enumerate((tag for tag, count in tag_counts.items() if count > 1), start=1)}
+    has_score = any("score" in segment for segment in segments)
+
+    lines = []
+    if tag_ids:
+        lines.append(headers["tags"] + ", ".join(f"{tag_id}={tag}" for tag, tag_id in tag_ids.items()))
+    columns = headers["columns"][:2] + ([headers["score"]] if has_score else []) + headers["columns"][2:]
+    lines.append("|".join(columns))
+    for segment, tags in zip(segments, segment_tags):
+        start, end = segment_seconds(segment)
+        desc = re.sub(r'\s+', ' ', str(segment.get("desc", ""))).replace("|", "/").strip()
+        row = [f"{start:.1f}", f"{end:.1f}"]
+        if has_score:
+            row.append(f"{segment.get('score', 0):g}")
+        row += [" ".join(tag_ids.get(tag, tag) for tag in tags), desc]
+        lines.append("|".join(row))
+    return "\n".join(lines)
@@ -0,0 +1,128 @@
+# -*- coding: UTF-8 -*-
+# retrieval_tool.py
+
+import os
+import hashlib
+import numpy as np
+from utils.gpt_tool import get_embeddings
+from config import OLLAMA_EMBED_MODEL, SCENE_RETRIEVAL_OPTIONS
+from logger import logger
+
+
+def scene_text(segment: dict) -> str:
+    """text of a scene that is embedded, desc and tags"""
+    return f"{segment.get('desc', '')}\n{', '.join(segment.get('tag', []))}"
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """unit length rows, cosine similarity becomes a dot product"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class SceneIndex:
+    """normalized scene embeddings in scene order, saved as npz next to the video segment info"""
+
+    def __init__(self, vectors: np.ndarray, keys: list, model: str):
+        self.vectors = vectors
+        self.keys = keys
+        self.model = model
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, index_path: str):
+        """SceneIndex or None when missing or unreadable"""
+        if not os.path.exists(index_path):
+            return None
+        try:
+            with np.load(index_path) as data:
+                return cls(data["vectors"], data["keys"].tolist(), str(data["model"]))
+        except Exception as e:
+            logger.error(f"load scene index {index_path} failed: {str(e)}")
+            return None
+
+    def save(self, index_path: str):
+        np.savez(index_path, vectors=self.vectors, keys=np.array(self.keys), model=np.array(self.model))
+
+    def query(self, vector, top_k: int) -> list[int]:
+        """scene positions of the top_k most cosine similar scenes, most similar first"""
+        query = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        similarity = self.vectors @ query
+        top_k = min(top_k, len(similarity))
+        top = np.argpartition(-similarity, top_k - 1)[:top_k]
+        return top[np.argsort(-similarity[top])].tolist()
+
+
+def build_scene_index(video_segment_info_list: list, index_path: str, batch_size: int = None):
+    """embed the scenes into a vector index, scenes whose text is unchanged reuse the saved vectors
+    Args:
+        video_segment_info_list (list): video segment info
+        index_path (str): npz path
+        batch_size (int): scenes per embed request, default SCENE_RETRIEVAL_OPTIONS["batch_size"]
+    Returns:
+        SceneIndex: or None when embedding fails
+    """
+    batch_size = batch_size or SCENE_RETRIEVAL_OPTIONS["batch_size"]
+    texts = [scene_text(segment) for segment in video_segment_info_list]
+    keys = [_text_key(text) for text in texts]
+
+    saved = SceneIndex.load(index_path)
+    if saved is not None and saved.model == OLLAMA_EMBED_MODEL and saved.keys == keys:
+        return saved
+    known = {}
+    if saved is not None and saved.model == OLLAMA_EMBED_MODEL:
+        known = {key: vector for key, vector in zip(saved.keys, saved.vectors)}
+
+    missing = [i for i, key in enumerate(keys) if key not in known]
+    try:
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            embeddings = get_embeddings([texts[position] for position in batch])
+            for position, embedding in zip(batch, embeddings):
+                known[keys[position]] = _normalize(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+    except Exception as e:
+        logger.error(f"build scene index failed: {str(e)}")
+        return None
+
+    vectors = np.stack([known[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+    index = SceneIndex(vectors, keys, OLLAMA_EMBED_MODEL)
+    index.save(index_path)
+    logger.info(f"scene index built, scenes: {len(keys)}, embedded: {len(missing)}")
+    return index
+
+
+def retrieve_segments(video_segment_info_list: list, queries: list, index_path: str, top_k: int = None) -> list:
+    """scenes most relevant to any of the queries, in time order
+    all scenes are returned when there are at most top_k of them or retrieval fails
+    Args:
+        video_segment_info_list (list): video segment info
+        queries (list): query texts, e.g. one per perspective, each retrieves top_k scenes
+        index_path (str): scene index npz path
+        top_k (int): scenes per query, default SCENE_RETRIEVAL_OPTIONS["top_k"]
+    Returns:
+        list: selected video segment info
+    """
+    top_k = top_k or SCENE_RETRIEVAL_OPTIONS["top_k"]
+    if len(video_segment_info_list) <= top_k or not queries:
+        return video_segment_info_list
+
+    index = build_scene_index(video_segment_info_list, index_path)
+    if index is None:
+        return video_segment_info_list
+    try:
+        query_vectors = get_embeddings(list(queries))
+    except Exception as e:
+        logger.error(f"embed retrieval queries failed: {str(e)}")
+        return video_segment_info_list
+
+    selected = set()
+    for vector in query_vectors:
+        selected.update(index.query(vector, top_k))
+    logger.info(f"retrieved {len(selected)} of {len(video_segment_info_list)} scenes for {len(queries)} queries")
+    return [video_segment_info_list[position] for position in sorted(selected)]
@@ -0,0 +1,196 @@
+# -*- coding: UTF-8 -*-
+# script_tool.py
+
+import json
+from typing import Callable, List
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel
+from utils.gpt_tool import get_gpt_response
+from utils.prompt_tool import estimate_tokens, segment_seconds, encode_segments_compact
+from config import DEFAULT_LANGUAGE, OLLAMA_OPTIONS, SCRIPT_MAP_REDUCE_OPTIONS, SCRIPT_PROMPT_ENCODING
+from sys_prompts import DEFAULT_PROMPT
+from logger import logger
+
+
+# map step response classes
+class SceneCandidate(BaseModel):
+    start: float
+    end: float
+    desc: str
+    tag: List[str]
+    score: float
+
+
+class SegmentSummary(BaseModel):
+    summary: str
+    candidates: List[SceneCandidate]
+
+
+def dump_segment_info(video_segment_info_list: list) -> str:
+    """segment list as it is put into script prompts, SCRIPT_PROMPT_ENCODING "compact" table or "json" """
+    if SCRIPT_PROMPT_ENCODING == "compact":
+        return encode_segments_compact(video_segment_info_list)
+    return json.dumps(video_segment_info_list, ensure_ascii=False, indent=2)
+
+
+def chunk_segments(segments: list, max_tokens: int) -> list[list]:
+    """split segments in time order into chunks whose json fits max_tokens, at least one segment per chunk"""
+    chunks, chunk, chunk_tokens = [], [], 0
+    for segment in segments:
+        tokens = estimate_tokens(dump_segment_info([segment]))
+        if chunk and chunk_tokens + tokens > max_tokens:
+            chunks.append(chunk)
+            chunk, chunk_tokens = [], 0
+        chunk.append(segment)
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _as_candidate(segment: dict) -> dict:
+    """segment info in candidate form, used when a chunk cannot be summarized"""
+    start, end = segment_seconds(segment)
+    return {"start": start, "end": end, "desc": segment.get("desc", ""), "tag": segment.get("tag", []), "score": segment.get("score", 0)}
+
+
+def summarize_chunk(chunk: list, candidate_count: int) -> list[dict] | None:
+    """map step: pick and score the best clips of a chunk of segments
+    Args:
+        chunk (list): segment infos or candidates in time order
+        candidate_count (int): max candidates
+    Returns:
+        list[dict] | None: [{"start", "end", "desc", "tag", "score"}] clamped to the time range of the chunk
+    """
+    try:
+        prompt = DEFAULT_PROMPT['segment_summary'][DEFAULT_LANGUAGE].format(video_segment_info_list=dump_segment_info(chunk), candidate_count=candidate_count)
+        role_desc = DEFAULT_PROMPT['screenwriter_role_desc'][DEFAULT_LANGUAGE]
+        response = get_gpt_response(prompt, response_format=SegmentSummary.model_json_schema(), role_desc=role_desc)
+        summary = SegmentSummary.model_validate(response)
+    except Exception as e:
+        logger.error(f"summarize segment chunk failed: {str(e)}")
+        return None
+
+    spans = [segment_seconds(segment) for segment in chunk]
+    chunk_start, chunk_end = min(start for start, _ in spans), max(end for _, end in spans)
+    candidates = []
+    for candidate in sorted(summary.candidates, key=lambda c: -c.score)[:candidate_count]:
+        start = min(max(candidate.start, chunk_start), chunk_end)
+        end = min(max(candidate.end, chunk_start), chunk_end)
+        if end <= start:
+            continue
+        candidates.append({"start": round(start, 3), "end": round(end, 3), "desc": candidate.desc, "tag": candidate.tag, "score": candidate.score})
+    return sorted(candidates, key=lambda c: c["start"])
+
+
+def compress_segments(video_segment_info_list: list, render_prompt: Callable[[list], str], options: dict = None) -> list:
+    """map-reduce a segment list until the script prompt fits the chat model context
+    every map round summarizes chunks of the list in parallel into scored candidates,
+    rounds repeat on the candidates, so the rounds grow with the log of the video length
+    Args:
+        video_segment_info_list (list): segment infos
+        render_prompt (Callable): segment list -> full script prompt
+        options (dict): {"enable", "reserved_tokens", "candidates_per_chunk", "workers"}, default SCRIPT_MAP_REDUCE_OPTIONS
+    Returns:
+        list: the original list when its prompt fits, else the candidates for the reduce call
+    """
+    options = options or SCRIPT_MAP_REDUCE_OPTIONS
+    budget = OLLAMA_OPTIONS["num_ctx"] - options["reserved_tokens"]
+    fits = lambda segments: estimate_tokens(render_prompt(segments)) <= budget
+
+    if not options["enable"] or fits(video_segment_info_list):
+        return video_segment_info_list
+
+    logger.info(f"script prompt of {len(video_segment_info_list)} segments exceeds {budget} tokens, switch to map-reduce")
+    map_budget = budget - estimate_tokens(DEFAULT_PROMPT['segment_summary'][DEFAULT_LANGUAGE])
+    segments = video_segment_info_list
+    map_round = 0
+    while not fits(segments):
+        map_round += 1
+        chunks = chunk_segments(segments, map_budget)
+        with ThreadPoolExecutor(max_workers=min(len(chunks), options["workers"])) as executor:
+            results = list(executor.map(lambda chunk: summarize_chunk(chunk, options["candidates_per_chunk"]), chunks))
+
+        candidates = []
+        for chunk, result in zip(chunks, results):
+            candidates += result if result is not None else [_as_candidate(segment) for segment in chunk]
+        logger.info(f"map round {map_round}: {len(segments)} segments -> {len(candidates)} candidates from {len(chunks)} chunks")
+
+        if len(candidates) >= len(segments):
+            # no progress, keep the best scored candidates that fit
+            candidates = sorted(candidates, key=lambda c: -c["score"])
+            while len(candidates) > 1 and not fits(candidates):
+                candidates.pop()
+            segments = sorted(candidates, key=lambda c: c["start"])
+            break
+        segments = candidates
+    return segments
+
+
+class ClipStreamParser:
+    """incremental parser for a streamed json array of objects, {"video_clips": [...]} or a bare [...]
+    feed text deltas as they arrive and get back every object of the first array that became complete
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._array_started = False
+        self._array_closed = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = None
+
+    def feed(self, text: str) -> list[dict]:
+        """scan new text
+        Returns:
+            list: objects completed by this text, objects that are not valid json are logged and dropped
+        """
+        self._buffer += text
+        completed = []
+        buffer = self._buffer
+        while self._pos < len(buffer) and not self._array_closed:
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif not self._array_started:
+                if char == "[":
+                    self._array_started = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0 and char == "]":
+                    self._array_closed = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._object_start is not None:
+                        raw = buffer[self._object_start:self._pos + 1]
+                        self._object_start = None
+                        try:
+                            completed.append(json.loads(raw))
+                        except json.JSONDecodeError:
+                            logger.error(f"stream clip parse error:{raw}")
+            self._pos += 1
+
+        # text before a pending object is no longer needed
+        keep = self._object_start if self._object_start is not None else self._pos
+        self._buffer = buffer[keep:]
+        self._pos -= keep
+        if self._object_start is not None:
+            self._object_start = 0
+        return completed
+
+    @property
+    def closed(self) -> bool:
+        """the array end was seen"""
+        return self._array_closed
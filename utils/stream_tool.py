@@ -0,0 +1,161 @@
+# -*- coding: UTF-8 -*-
+# stream_tool.py
+
+import queue
+import threading
+import numpy as np
+from typing import Iterable, Iterator
+from config import FRAME_STREAM_OPTIONS
+from logger import logger
+
+
+class ByteBudget:
+    """cap on bytes held in flight, shared by every thread that acquires from it"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes: int, timeout: float = None) -> bool:
+        """wait until nbytes fit into the budget, one oversized item is let through when nothing else is in flight
+        Returns:
+            bool: False on timeout
+        """
+        with self._cond:
+            fits = lambda: self.used == 0 or self.used + nbytes <= self.max_bytes
+            if not self._cond.wait_for(fits, timeout=timeout):
+                return False
+            self.used += nbytes
+            return True
+
+    def release(self, nbytes: int):
+        with self._cond:
+            self.used = max(self.used - nbytes, 0)
+            self._cond.notify_all()
+
+
+# in-flight decoded frame bytes across all workers
+FRAME_BYTE_BUDGET = ByteBudget(FRAME_STREAM_OPTIONS["max_inflight_mb"] * 1024 * 1024)
+
+
+class FrameArena:
+    """one growable buffer holding encoded frames back to back, reused between scenes instead of one bytes object per frame"""
+
+    def __init__(self, capacity: int = 1024 * 1024):
+        self._buffer = bytearray(capacity)
+        self._size = 0
+        self._spans = []
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    @property
+    def nbytes(self) -> int:
+        return self._size
+
+    def append(self, data) -> int:
+        """copy an encoded frame into the arena
+        Returns:
+            int: index of the frame
+        """
+        data = memoryview(data).cast("B")
+        end = self._size + data.nbytes
+        if end > len(self._buffer):
+            grown = bytearray(max(end, len(self._buffer) * 2))
+            grown[:self._size] = self._buffer[:self._size]
+            self._buffer = grown
+        self._buffer[self._size:end] = data
+        self._spans.append((self._size, data.nbytes))
+        self._size = end
+        return len(self._spans) - 1
+
+    def view(self, index: int) -> memoryview:
+        """zero-copy view of one frame, release it before the next append"""
+        offset, length = self._spans[index]
+        return memoryview(self._buffer)[offset:offset + length]
+
+    def reset(self):
+        """drop all frames and keep the capacity"""
+        self._size = 0
+        self._spans = []
+
+
+_local = threading.local()
+
+
+def get_frame_arena() -> FrameArena:
+    """reset and return the frame arena of the current thread"""
+    arena = getattr(_local, "arena", None)
+    if arena is None:
+        arena = _local.arena = FrameArena()
+    arena.reset()
+    return arena
+
+
+_END = object()
+
+
+def stream_frames(frames: Iterable[tuple[int, np.ndarray]], queue_size: int = None, byte_budget: ByteBudget = None) -> Iterator[tuple[int, np.ndarray]]:
+    """decode frames in a background thread through a bounded queue
+    the bytes of every frame are held against byte_budget from decode until the consumer asks for the next frame,
+    so at most queue_size frames wait in the queue and the total across all streams stays under the budget
+    Args:
+        frames: (frame_number, frame) iterable, e.g. FrameSampler.sample
+        queue_size: max decoded frames waiting for the consumer, default FRAME_STREAM_OPTIONS["queue_size"]
+        byte_budget: shared in-flight byte cap, default FRAME_BYTE_BUDGET
+    Yields:
+        tuple: (frame_number, frame)
+    """
+    queue_size = queue_size or FRAME_STREAM_OPTIONS["queue_size"]
+    byte_budget = byte_budget or FRAME_BYTE_BUDGET
+    frame_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for frame_number, frame in frames:
+                while not byte_budget.acquire(frame.nbytes, timeout=0.1):
+                    if stop.is_set():
+                        return
+                if not put((frame_number, frame)):
+                    byte_budget.release(frame.nbytes)
+                    return
+            put(_END)
+        except Exception as e:
+            logger.error(f"decode frames failed: {str(e)}")
+            put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = frame_queue.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            try:
+                yield item
+            finally:
+                byte_budget.release(item[1].nbytes)
+    finally:
+        stop.set()
+        producer.join()
+        # give back the budget of frames nobody will consume
+        while True:
+            try:
+                item = frame_queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, tuple):
+                byte_budget.release(item[1].nbytes)
@@ -8,13 +8,19 @@ import json
 import ffmpeg
 import subprocess
 import numpy as np
+from fractions import Fraction
 from typing import Optional
 from pathlib import Path
-from scenedetect import VideoManager, SceneManager
+from scenedetect import VideoManager, SceneManager, open_video
+from scenedetect.scene_manager import compute_downscale_factor
 from scenedetect.detectors import ContentDetector
+from scenedetect.scene_detector import FlashFilter
+from scenedetect.frame_timecode import FrameTimecode
 from scenedetect.video_splitter import split_video_ffmpeg
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from config import OUTPUT_DIR, TEMP_DIR
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from utils.frame_tool import snap_to_keyframe, get_frame_sampler
+from utils.stream_tool import FRAME_BYTE_BUDGET
+from config import OUTPUT_DIR, TEMP_DIR, SCENE_LENGTH_OPTIONS
 from logger import logger
 
 
@@ -33,6 +39,21 @@ def get_video_fps(video_path: str) -> int | None:
     return int(fps)
 
 
+def get_video_size(video_path: str) -> tuple[int, int] | None:
+    """get video (width, height)
+    Args:
+        video_path (str): video path
+    Returns:
+        tuple[int, int] | None: frame size
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+    size = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    return size
+
+
 def get_video_duration(video_path: str, unit: str = 'seconds') -> float | None:
     """get video duration
     Args:
@@ -56,16 +77,348 @@ def get_video_duration(video_path: str, unit: str = 'seconds') -> float | None:
         return None
 
 
-def split_video_by_scenes(video_path: str, output_folder: str = None, video_timeline_json_path: str = None, threshold: int = 30, downscale_factor: int = 1, split_video: bool = True, regenerate_timeline: bool = False):
+def _parse_keyframe_probe(probe: dict) -> dict:
+    """parse ffprobe packet json into a keyframe index
+    Args:
+        probe (dict): ffprobe json with "packets" and "streams"
+    Returns:
+        dict: {"fps", "pts", "pos", "keyframe", "keyframe_frames"}, packets sorted by pts
+    """
+    fps = float(Fraction(probe["streams"][0]["r_frame_rate"]))
+    packets = [p for p in probe.get("packets", []) if p.get("pts_time", "N/A") != "N/A"]
+    pts = np.array([float(p["pts_time"]) for p in packets], dtype=np.float64)
+    pos = np.array([int(p["pos"]) if p.get("pos", "N/A") != "N/A" else -1 for p in packets], dtype=np.int64)
+    keyframe = np.array(["K" in p.get("flags", "") for p in packets], dtype=bool)
+
+    # packets come in decode order, seeking works in presentation order
+    order = np.argsort(pts, kind="stable")
+    pts, pos, keyframe = pts[order], pos[order], keyframe[order]
+    start_pts = pts[0] if len(pts) else 0.0
+    keyframe_frames = np.round((pts[keyframe] - start_pts) * fps).astype(np.int64)
+    return {"fps": fps, "pts": pts, "pos": pos, "keyframe": keyframe, "keyframe_frames": keyframe_frames}
+
+
+def build_keyframe_index(video_path: str, index_path: str = None, regenerate: bool = False) -> dict | None:
+    """build keyframe index (packet pts, keyframe flags, byte offsets) with one ffprobe pass
+    Args:
+        video_path (str): video path
+        index_path (str, optional): npz cache path. Defaults to None, no cache.
+        regenerate (bool, optional): ignore the cached index. Defaults to False.
+    Returns:
+        dict | None: {"fps", "pts", "pos", "keyframe", "keyframe_frames"}
+    """
+    try:
+        if index_path and os.path.isfile(index_path):
+            if regenerate:
+                os.remove(index_path)
+            else:
+                with np.load(index_path) as data:
+                    return {k: (float(data[k]) if k == "fps" else data[k]) for k in data.files}
+
+        if not os.path.isfile(video_path):
+            logger.error(f"video not exist: {video_path}")
+            return None
+        cmd = f'ffprobe -v error -select_streams v:0 -show_entries packet=pts_time,pos,flags:stream=r_frame_rate -of json "{video_path}"'
+        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        if result.returncode != 0:
+            logger.error(f"probe video packets failed: {result.stderr}")
+            return None
+
+        index = _parse_keyframe_probe(json.loads(result.stdout))
+        if index_path:
+            np.savez(index_path, **index)
+        logger.info(f"keyframe index built, packets: {len(index['pts'])}, keyframes: {len(index['keyframe_frames'])}")
+        return index
+    except Exception as e:
+        logger.error(f"build keyframe index error: {str(e)}")
+        return None
+
+
+class _ScoreRecordingDetector(ContentDetector):
+    """ContentDetector that keeps the content_val of every frame,
+    a StatsManager would do the same but also computes the unused edge component, doubling detection time
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scores = {}
+
+    def process_frame(self, frame_num, frame_img):
+        cuts = super().process_frame(frame_num, frame_img)
+        if self._frame_score is not None:
+            self.scores[frame_num] = self._frame_score
+        return cuts
+
+    def score_array(self, start_frame: int, end_frame: int) -> np.ndarray:
+        """float32 content_val of [start_frame, end_frame), 0 where a frame was not decoded"""
+        scores = np.zeros(max(end_frame - start_frame, 0), dtype=np.float32)
+        for frame_number in range(start_frame, end_frame):
+            scores[frame_number - start_frame] = self.scores.get(frame_number, 0)
+        return scores
+
+
+def scene_detect_downscale(frame_size: tuple, downscale_factor: int = 1) -> float:
+    """downscale factor scene detection actually works at, the scale of the saved content scores
+    Args:
+        frame_size: (width, height) of the video
+        downscale_factor: requested factor, 1 for the auto downscale
+    Returns:
+        float: effective downscale factor
+    """
+    if downscale_factor and downscale_factor > 1:
+        return float(int(downscale_factor))
+    return float(compute_downscale_factor(max(frame_size)))
+
+
+def set_detect_downscale(scene_manager: SceneManager, downscale_factor: int = 1):
+    """downscale of scene detection, the same on every detection path so content scores share one scale
+    a factor above 1 is used as is, otherwise SceneManager keeps its auto downscale (about 256 px wide frames)
+    """
+    if downscale_factor and downscale_factor > 1:
+        scene_manager.auto_downscale = False
+        scene_manager.downscale = int(downscale_factor)
+
+
+def save_scene_stats(stats_path: str, scores: np.ndarray, fps: float, video_path: str, downscale_factor: float = 1):
+    """save per-frame ContentDetector scores as a compact npz, downscale_factor is the effective one from scene_detect_downscale"""
+    np.savez(
+        stats_path,
+        scores=scores.astype(np.float32),
+        fps=np.float64(fps),
+        video_path=np.array(os.path.abspath(video_path)),
+        downscale_factor=np.float64(downscale_factor),
+    )
+    logger.info(f"scene stats saved, frames: {len(scores)}: {stats_path}")
+
+
+def load_scene_stats(stats_path: str) -> dict | None:
+    """scene stats from save_scene_stats
+    Returns:
+        dict | None: {"scores", "fps", "video_path", "downscale_factor"}
+    """
+    if not os.path.isfile(stats_path):
+        return None
+    try:
+        with np.load(stats_path) as data:
+            return {
+                "scores": data["scores"],
+                "fps": float(data["fps"]),
+                "video_path": str(data["video_path"]),
+                "downscale_factor": float(data["downscale_factor"]),
+            }
+    except Exception as e:
+        logger.error(f"load scene stats {stats_path} failed: {str(e)}")
+        return None
+
+
+def detect_scenes_from_stats(scene_stats: dict | str, threshold: float = 30, min_scene_len: int = 15) -> list[tuple] | None:
+    """recompute the scene list for another threshold or minimum scene length from saved scores, without decoding
+    cuts go through the same flash filter as ContentDetector, so the result matches a full detection run
+    Args:
+        scene_stats: scene stats dict or npz path from save_scene_stats
+        threshold: content_val threshold. Defaults to 30.
+        min_scene_len: minimum scene length in frames. Defaults to 15.
+    Returns:
+        list[tuple] | None: scene list of (start FrameTimecode, end FrameTimecode), same as SceneManager.get_scene_list
+    """
+    if isinstance(scene_stats, str):
+        scene_stats = load_scene_stats(scene_stats)
+    if not scene_stats:
+        return None
+
+    scores = scene_stats["scores"]
+    above = scores >= threshold
+    flash_filter = FlashFilter(mode=FlashFilter.Mode.MERGE, length=min_scene_len)
+    cut_frames = []
+    for frame_number in range(len(scores)):
+        cut_frames += flash_filter.filter(frame_num=frame_number, above_threshold=bool(above[frame_number]))
+
+    if not cut_frames:
+        return []
+    fps = scene_stats["fps"]
+    boundaries = [0] + sorted(set(cut_frames)) + [len(scores)]
+    return [
+        (FrameTimecode(start, fps), FrameTimecode(end, fps))
+        for start, end in zip(boundaries[:-1], boundaries[1:])
+    ]
+
+
+def normalize_scene_lengths(scene_list: list[tuple], min_seconds: float = 0, max_seconds: float = 0) -> list[tuple]:
+    """merge scenes shorter than min_seconds into their neighbours and split scenes longer than max_seconds
+    a run of consecutive short scenes, e.g. a burst of flashes or fast edits, is kept as one scene when it reaches
+    min_seconds together, otherwise it joins the previous scene (the next one at the start of the video)
+    Args:
+        scene_list: scene list of (start FrameTimecode, end FrameTimecode)
+        min_seconds: minimum scene duration, 0 keeps short scenes
+        max_seconds: maximum scene duration, longer scenes are split into equal parts, 0 keeps long scenes
+    Returns:
+        list[tuple]: scene list of (start FrameTimecode, end FrameTimecode) covering the same frames
+    """
+    if not scene_list or (min_seconds <= 0 and max_seconds <= 0):
+        return scene_list
+    fps = scene_list[0][0].framerate
+    min_frames = int(round(min_seconds * fps))
+    max_frames = int(round(max_seconds * fps))
+    bounds = [[start.get_frames(), end.get_frames()] for start, end in scene_list]
+
+    if min_frames > 0:
+        # collapse consecutive short scenes into runs, a run long enough on its own stays a scene
+        runs = []
+        for start, end in bounds:
+            short = end - start < min_frames
+            if short and runs and runs[-1][2]:
+                runs[-1][1] = end
+            else:
+                runs.append([start, end, short])
+        merged = []
+        pending = None
+        for start, end, _ in runs:
+            if pending is not None:
+                start, pending = pending, None
+            if end - start >= min_frames:
+                merged.append([start, end])
+            elif merged:
+                merged[-1][1] = end
+            else:
+                pending = start
+        if pending is not None:
+            # the whole video is shorter than min_seconds
+            merged.append([pending, bounds[-1][1]])
+        bounds = merged
+
+    if max_frames > 0:
+        split = []
+        for start, end in bounds:
+            parts = max(-(-(end - start) // max_frames), 1)
+            edges = [start + (end - start) * i // parts for i in range(parts + 1)]
+            split += [[a, b] for a, b in zip(edges[:-1], edges[1:])]
+        bounds = split
+
+    return [(FrameTimecode(start, fps), FrameTimecode(end, fps)) for start, end in bounds]
+
+
+def _detect_scene_cuts_in_chunk(chunk: tuple) -> tuple[list[int], np.ndarray]:
+    """detect scene cuts of one time chunk, run in a worker process
+    Args:
+        chunk: (video_path, decode_start, decode_end, own_start, own_end, threshold, downscale_factor, min_scene_len)
+    Returns:
+        tuple: (cut frame numbers inside [own_start, own_end), content_val scores of [own_start, own_end))
+    """
+    video_path, decode_start, decode_end, own_start, own_end, threshold, downscale_factor, min_scene_len = chunk
+    video = open_video(video_path)
+    if decode_start > 0:
+        video.seek(decode_start)
+    detector = _ScoreRecordingDetector(threshold=threshold, min_scene_len=min_scene_len)
+    scene_manager = SceneManager()
+    scene_manager.add_detector(detector)
+    set_detect_downscale(scene_manager, downscale_factor)
+    scene_manager.detect_scenes(video=video, end_time=decode_end)
+    # every scene start after the first one is a cut
+    cut_frames = [scene[0].get_frames() for scene in scene_manager.get_scene_list(start_in_scene=True)[1:]]
+    return [frame for frame in cut_frames if own_start <= frame < own_end], detector.score_array(own_start, own_end)
+
+
+def detect_scenes_parallel(video_path: str, threshold: int = 30, downscale_factor: int = 1, workers: int = None, overlap_seconds: float = 2.0, min_scene_len: int = 15, stats_path: str = None) -> list[tuple] | None:
+    """detect scenes on overlapping time chunks in a process pool
+    Args:
+        video_path (str): video path
+        threshold (int, optional): threshold. Defaults to 30.
+        downscale_factor (int, optional): scene detect downscale factor, 1 for the auto downscale. Defaults to 1.
+        workers (int, optional): process count. Defaults to cpu count.
+        overlap_seconds (float, optional): extra seconds decoded on both sides of a chunk. Defaults to 2.0.
+        min_scene_len (int, optional): cuts closer than this many frames are merged. Defaults to 15.
+        stats_path (str, optional): save the per-frame scores of all chunks here. Defaults to None.
+    Returns:
+        list[tuple] | None: scene list of (start FrameTimecode, end FrameTimecode), same as SceneManager.get_scene_list
+    """
+    video = open_video(video_path)
+    fps = video.frame_rate
+    total_frames = video.duration.get_frames()
+
+    workers = workers or os.cpu_count() or 1
+    overlap_frames = int(fps * overlap_seconds)
+    # each chunk should be much longer than its overlap, otherwise decoding is mostly repeated
+    chunk_count = max(1, min(workers, total_frames // max(overlap_frames * 4, 1)))
+    chunk_frames = -(-total_frames // chunk_count)
+
+    chunks = []
+    for own_start in range(0, total_frames, chunk_frames):
+        own_end = min(own_start + chunk_frames, total_frames)
+        chunks.append((
+            video_path,
+            max(own_start - overlap_frames, 0),
+            min(own_end + overlap_frames, total_frames),
+            own_start,
+            own_end,
+            threshold,
+            downscale_factor,
+            min_scene_len,
+        ))
+    logger.info(f"detect scenes in {len(chunks)} chunks, chunk frames: {chunk_frames}, overlap frames: {overlap_frames}")
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        chunk_results = list(executor.map(_detect_scene_cuts_in_chunk, chunks))
+    chunk_cut_list = [cuts for cuts, _ in chunk_results]
+    if stats_path:
+        save_scene_stats(stats_path, np.concatenate([scores for _, scores in chunk_results]), fps, video_path, scene_detect_downscale(video.frame_size, downscale_factor))
+
+    # cuts near a chunk border can be found by both neighbours at slightly different frames
+    cut_frames = []
+    for frame in sorted(frame for cuts in chunk_cut_list for frame in cuts):
+        if cut_frames and frame - cut_frames[-1] < min_scene_len:
+            continue
+        cut_frames.append(frame)
+
+    if not cut_frames:
+        return []
+    boundaries = [0] + cut_frames + [total_frames]
+    return [
+        (FrameTimecode(start, fps), FrameTimecode(end, fps))
+        for start, end in zip(boundaries[:-1], boundaries[1:])
+    ]
+
+
+def _timeline_matches_mode(video_timeline_json_path: str, output_folder: str, split_files: bool) -> bool:
+    """whether a cached video_timeline.json can serve the current segment mode
+    Args:
+        video_timeline_json_path (str): cached timeline
+        output_folder (str): folder of the split files
+        split_files (bool): every scene needs an existing split file in "video_name"
+    Returns:
+        bool: timeline is usable
+    """
+    try:
+        with open(video_timeline_json_path, 'r', encoding='utf-8') as f:
+            video_timeline_list = json.loads(f.read())
+    except (OSError, ValueError) as e:
+        logger.warning(f"read video timeline {video_timeline_json_path} failed: {str(e)}")
+        return False
+    if not video_timeline_list:
+        return True
+    if not all("start_frame" in v and "end_frame" in v for v in video_timeline_list):
+        return False
+    if split_files:
+        return all("video_name" in v and os.path.isfile(f"{output_folder}{v['video_name']}") for v in video_timeline_list)
+    return True
+
+
+def split_video_by_scenes(video_path: str, output_folder: str = None, video_timeline_json_path: str = None, threshold: int = 30, downscale_factor: int = 1, split_video: bool = True, regenerate_timeline: bool = False, workers: int = 1, virtual_segments: bool = False, min_scene_len: int = 15, stats_path: str = None, min_scene_seconds: float = None, max_scene_seconds: float = None):
     """split video by scenes
     Args:
         video_path (str): video path
         output_folder (str, optional): output folder. Defaults to None.
         video_timeline_json_path (str, optional): video timeline json path. Defaults to None.
         threshold (int, optional): threshold. Defaults to 30.
-        downscale_factor (int, optional): downscale factor. Defaults to 1.
+        downscale_factor (int, optional): scene detect downscale factor, 1 for the auto downscale. Defaults to 1.
         split_video (bool, optional): split video. Defaults to True.
         regenerate_timeline (bool, optional): regenerate timeline. Defaults to False.
+        workers (int, optional): scene detect processes, more than 1 detects time chunks in parallel. Defaults to 1.
+        virtual_segments (bool, optional): keep scenes as (source, start, end) ranges of the source video instead of splitting files. Defaults to False.
+        min_scene_len (int, optional): minimum scene length in frames. Defaults to 15.
+        stats_path (str, optional): per-frame scene detection scores, saved on the first detection and
+            reused by later runs with another threshold instead of decoding. Defaults to scene_stats.npz in output_folder.
+        min_scene_seconds (float, optional): merge shorter scenes into their neighbours. Defaults to SCENE_LENGTH_OPTIONS["min_seconds"].
+        max_scene_seconds (float, optional): split longer scenes. Defaults to SCENE_LENGTH_OPTIONS["max_seconds"].
     Returns:
         List[tuple] | None: scene timeline list
     """
@@ -88,26 +441,53 @@ def split_video_by_scenes(video_path: str, output_folder: str = None, video_time
 
     if not video_timeline_json_path:
         video_timeline_json_path = f"{output_folder}video_timeline.json"
+    if not stats_path:
+        stats_path = f"{output_folder}scene_stats.npz"
 
     if os.path.isfile(video_timeline_json_path):
         if regenerate_timeline:
             os.remove(video_timeline_json_path)
-        else:
+        elif _timeline_matches_mode(video_timeline_json_path, output_folder, split_video and not virtual_segments):
             return video_timeline_json_path
+        else:
+            # e.g. written by a virtual segments or single-pass run, split files are missing; the saved stats skip the decode
+            logger.info(f"cached video timeline does not match the segment mode, regenerate: {video_timeline_json_path}")
 
     try:
-        video_manager = VideoManager([video_path])
-        scene_manager = SceneManager()
-        scene_manager.add_detector(ContentDetector(threshold=threshold))    # 添加内容检测器，并设置检测阈值（threshold），用于判断场景切换
-        video_manager.set_downscale_factor(downscale_factor)                # 设置视频降采样因子，用于降低分辨率以加快处理速度
-        video_manager.start()                                               # 启动视频管理器，开始读取视频帧
-        scene_manager.detect_scenes(frame_source=video_manager)             # 利用视频管理器作为帧源，检测视频中的场景切换点
-        scene_timeline_list = scene_manager.get_scene_list()                # 获取检测到的场景列表
+        scene_stats = load_scene_stats(stats_path)
+        video_size = get_video_size(video_path) if scene_stats else None
+        # scores are reused only when they were computed at the scale this run would detect at
+        if video_size and scene_stats["video_path"] == os.path.abspath(video_path) and np.isclose(scene_stats["downscale_factor"], scene_detect_downscale(video_size, downscale_factor)):
+            # 复用已保存的逐帧分数，按新阈值重新计算切点，无需解码
+            logger.info(f"detect scenes from saved stats: {stats_path}, threshold: {threshold}, min scene len: {min_scene_len}")
+            scene_timeline_list = detect_scenes_from_stats(scene_stats, threshold=threshold, min_scene_len=min_scene_len)
+        elif workers > 1:
+            scene_timeline_list = detect_scenes_parallel(video_path, threshold=threshold, downscale_factor=downscale_factor, workers=workers, min_scene_len=min_scene_len, stats_path=stats_path)
+        else:
+            video_manager = VideoManager([video_path])
+            detector = _ScoreRecordingDetector(threshold=threshold, min_scene_len=min_scene_len)   # 记录逐帧分数，换阈值时无需重新解码
+            scene_manager = SceneManager()
+            scene_manager.add_detector(detector)                                # 添加内容检测器，并设置检测阈值（threshold），用于判断场景切换
+            set_detect_downscale(scene_manager, downscale_factor)              # 设置视频降采样因子，默认自动降采样，与并行检测一致
+            video_manager.start()                                               # 启动视频管理器，开始读取视频帧
+            scene_manager.detect_scenes(frame_source=video_manager)             # 利用视频管理器作为帧源，检测视频中的场景切换点
+            scene_timeline_list = scene_manager.get_scene_list()                # 获取检测到的场景列表
+            frame_count = video_manager.get_current_timecode().get_frames()
+            save_scene_stats(stats_path, detector.score_array(0, frame_count), video_manager.get_framerate(), video_path, scene_detect_downscale(video_manager.get_framesize(), downscale_factor))
+            video_manager.release()
 
         if not scene_timeline_list:
             logger.warning("no scene timeline found")
             return []
         else:
+            detected_count = len(scene_timeline_list)
+            scene_timeline_list = normalize_scene_lengths(
+                scene_timeline_list,
+                SCENE_LENGTH_OPTIONS["min_seconds"] if min_scene_seconds is None else min_scene_seconds,
+                SCENE_LENGTH_OPTIONS["max_seconds"] if max_scene_seconds is None else max_scene_seconds,
+            )
+            if len(scene_timeline_list) != detected_count:
+                logger.info(f"scene length normalized, scene count: {detected_count} -> {len(scene_timeline_list)}")
             video_timeline_list = []
             for scene_timeline in scene_timeline_list:
                 scene_timeline = {
@@ -118,9 +498,17 @@ def split_video_by_scenes(video_path: str, output_folder: str = None, video_time
                 }
                 video_timeline_list.append(scene_timeline)
       
-        if split_video:
+        if virtual_segments:
+            for v, scene_timeline in zip(video_timeline_list, scene_timeline_list):
+                v.update({
+                    "source": video_path,
+                    "start": scene_timeline[0].get_seconds(),
+                    "end": scene_timeline[1].get_seconds(),
+                })
+        elif split_video:
             split_video_ffmpeg(video_path, scene_timeline_list, output_folder, show_progress=True)
-            split_video_file_list = os.listdir(output_folder)
+            # only the files written by the splitter, the folder also holds the timeline and scene stats
+            split_video_file_list = sorted(f for f in os.listdir(output_folder) if f.startswith(f"{video_name}-Scene-"))
             print(split_video_file_list)
             if len(split_video_file_list) != len(video_timeline_list):
                 logger.error(f"split video count not equal scene count, split video count: {len(split_video_file_list)}, scene count: {len(video_timeline_list)}")
@@ -153,7 +541,7 @@ def is_black_frame(frame: np.ndarray, threshold: int = 30) -> bool:
     return mean_brightness < threshold
 
 
-def extract_video_specific_frame(video_path: str, output_folder: str,frame_number: Optional[int] = None, custom_filename: Optional[str] = None, max_check_seconds: int = 10):
+def extract_video_specific_frame(video_path: str, output_folder: str,frame_number: Optional[int] = None, custom_filename: Optional[str] = None, max_check_seconds: int = 10, sampler: str = "seek"):
     """extract video specified frame
     Args:
         video_path: video path
@@ -161,6 +549,7 @@ def extract_video_specific_frame(video_path: str, output_folder: str,frame_numbe
         frame_number: if specified, extract specified frame number, else extract first non-black frame
         custom_filename: custom output filename
         max_check_seconds: maximum check seconds
+        sampler: frame sampler backend used to find the first non-black frame, "seek", "grab", "ffmpeg" or "auto"
     
     Returns:
         str: saved image path
@@ -203,29 +592,24 @@ def extract_video_specific_frame(video_path: str, output_folder: str,frame_numbe
                 logger.info(f"success extract frame {frame_number} and save as png: {output_path}")
                 return output_path
         
-        # detect non-black frame
-        checked_frames = 0
-        while checked_frames < max_check_frames and checked_frames < total_frames:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, checked_frames)
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
+        # detect non-black frame by second
+        cap.release()
+        step = int(fps)
+        check_end_frame = min(max_check_frames, total_frames)
+        frame_sampler = get_frame_sampler(video_path, sampler=sampler, step=step, sample_count=len(range(0, check_end_frame, step)))
+        if not frame_sampler:
+            return None
+        for checked_frames, frame in frame_sampler.sample(0, check_end_frame, step):
             if not is_black_frame(frame):
                 current_second = checked_frames / fps
                 output_filename = custom_filename or f"frame_{checked_frames}.png"
                 output_path = os.path.join(output_folder, output_filename)
                 cv2.imwrite(output_path, frame)
-                cap.release()
                 
                 logger.info(f"{current_second:.1f}s find non-black frame and save as png: {output_path}")
                 return output_path
-                
-            # detect next non-black frame by second
-            checked_frames += int(fps)
         
         # all frames are black
-        cap.release()
         logger.error(f"video {video_path} all frames are black, max check seconds: {max_check_seconds}")
         return None
 
@@ -236,11 +620,14 @@ def extract_video_specific_frame(video_path: str, output_folder: str,frame_numbe
         return None
 
 
-def is_valid_video(video_path: str, check_seconds: int = 10) -> bool:
+def is_valid_video(video_path: str, check_seconds: int = 10, start_frame: int = 0, end_frame: Optional[int] = None, keyframe_frames: Optional[np.ndarray] = None) -> bool:
     """check video is valid (whether there is a non-black frame)
     Args:
         video_path: video file path
         check_seconds: check seconds
+        start_frame: segment start frame, check a range of the video instead of the whole file
+        end_frame: segment end frame (exclusive), default the end of the video
+        keyframe_frames: keyframe index of the video, move checked frames onto nearby keyframes
     Returns:
         bool: video is valid
     """
@@ -256,11 +643,17 @@ def is_valid_video(video_path: str, check_seconds: int = 10) -> bool:
             return False
             
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if end_frame is not None:
+            total_frames = min(total_frames, end_frame)
+        total_frames -= start_frame
         max_check_frames = int(fps * check_seconds)
         
         checked_frames = 0
         while checked_frames < max_check_frames and checked_frames < total_frames:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, checked_frames)
+            seek_frame = start_frame + checked_frames
+            if keyframe_frames is not None:
+                seek_frame = snap_to_keyframe(seek_frame, keyframe_frames, int(fps) // 2, limit=start_frame + total_frames)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, seek_frame)
             ret, frame = cap.read()
 
             if not ret:
@@ -298,7 +691,7 @@ def _save_frame_in_thread(frame_data):
     return output_path
 
 
-def extract_video_frames_use_thread(video_path: str, frames_folder: str, frame_index: int = 10, interval: int = 0, scale_ratio: float = 1.0, max_workers: int = 4) -> list[str] | None:
+def extract_video_frames_use_thread(video_path: str, frames_folder: str, frame_index: int = 10, interval: int = 0, scale_ratio: float = 1.0, max_workers: int = 4, keyframe_frames: Optional[np.ndarray] = None, sampler: str = "seek") -> list[str] | None:
     """extract video frames use thread
     Args:
         video_path: video path
@@ -307,6 +700,8 @@ def extract_video_frames_use_thread(video_path: str, frames_folder: str, frame_i
         interval: interval (default: 0)
         scale_ratio: scale ratio (default: 1.0)
         max_workers: max workers (default: 4)
+        keyframe_frames: keyframe index of the video, move seek targets onto nearby keyframes (default: None)
+        sampler: frame sampler backend, "seek", "grab", "ffmpeg" or "auto" (default: "seek")
     Returns:
         list[str] | None: saved paths
     """
@@ -332,37 +727,40 @@ def extract_video_frames_use_thread(video_path: str, frames_folder: str, frame_i
             return None
             
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
         save_count = 0
         futures = []
         saved_paths = []
+
+        # frame_index of every (interval + 1) seconds
+        step = fps * (interval + 1)
+        frame_sampler = get_frame_sampler(
+            video_path,
+            sampler=sampler,
+            step=step,
+            sample_count=len(range(frame_index, total_frames, step)),
+            keyframe_frames=keyframe_frames,
+        )
+        if not frame_sampler:
+            return None
         
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            second_count = 0
-            while True:
-                # calculate current second frame index
-                target_frame = second_count * fps + frame_index
-                if target_frame >= total_frames:
-                    break
-                    
-                # set video to current second frame
-                cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame)
-                ret, frame = cap.read()
-                
-                if not ret:
-                    break
-                    
-                if interval == 0 or second_count % (interval + 1) == 0:
-                    output_path = os.path.join(
-                        frames_folder, 
-                        f"sec_{second_count:04d}_frame_{target_frame:06d}.jpg"
-                    )
-                    future = executor.submit(
-                        _save_frame_in_thread, 
-                        (frame.copy(), output_path, scale_ratio)
-                    )
-                    futures.append(future)
-                    save_count += 1
-                second_count += 1
+            for target_frame, frame in frame_sampler.sample(frame_index, total_frames, step):
+                second_count = (target_frame - frame_index) // fps
+                output_path = os.path.join(
+                    frames_folder, 
+                    f"sec_{second_count:04d}_frame_{target_frame:06d}.jpg"
+                )
+                # pending frames are held against the shared in-flight byte budget until saved
+                nbytes = frame.nbytes
+                FRAME_BYTE_BUDGET.acquire(nbytes)
+                future = executor.submit(
+                    _save_frame_in_thread, 
+                    (frame, output_path, scale_ratio)
+                )
+                future.add_done_callback(lambda _, nbytes=nbytes: FRAME_BYTE_BUDGET.release(nbytes))
+                futures.append(future)
+                save_count += 1
                 
             for future in as_completed(futures):
                 try:
@@ -372,7 +770,6 @@ def extract_video_frames_use_thread(video_path: str, frames_folder: str, frame_i
                 except Exception as e:
                     logger.error(f"save frame failed: {str(e)}")
                     
-        cap.release()
         logger.info(f"extract video all frames success, total frames: {save_count}")
         return sorted(saved_paths)
         